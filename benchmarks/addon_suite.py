@@ -0,0 +1,294 @@
+"""
+Benchmarks of the add-on as it runs in the editor, outside of Anki.
+
+The add-on is copied to a temporary folder (so that its user_files aren't touched) and
+imported with the stand-ins from standins.py instead of aqt and anki. Then
+- hilcd (with the snippet cache turned off) for each option combination below over the
+  files in benchmarks/corpus repeated to 10 to 50k lines. The time includes the
+  background job (see highlight_job.py) until the html is sent to the editor.
+- remove_leading_spaces and opening the helper menu for the same snippets (indented),
+- css_for_style for every pygments style (without the cache),
+- update_cssfile_in_mediafolder for some styles (the file in the media folder is
+  deleted before each call),
+- the search of the FilterDialog (fuzzy_panel.py) for typed queries over all languages
+  and over 20k deck names
+are timed. For each the percentiles of the time and the size of the output are printed.
+
+The results are compared with a baseline (benchmarks/baseline.json by default) and
+slower or larger results are flagged. The exit code is 1 if there is a regression.
+The committed baseline.json was recorded from the current code (not from the version
+before the performance changes), see README.md.
+
+    python benchmarks/addon_suite.py [--repeat N] [--sizes 10,100,1000] [--languages py,sql]
+                                     [--baseline FILE] [--save-baseline] [--tolerance 0.25]
+
+Large snippets (LARGE_LINES and more) are only highlighted with the default options and
+all benchmarks with them only run once.
+"""
+
+import argparse
+import importlib
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARKS)
+
+import standins  # noqa: E402
+from fuzzy_search_typing import TYPED, make_keys  # noqa: E402
+
+
+SRC = os.path.join(BENCHMARKS, "..", "src")
+CORPUS = os.path.join(BENCHMARKS, "corpus")
+PACKAGE = "syntax_highlighting_addon"
+LARGE_LINES = 10000
+ABSOLUTE_SLACK = 0.5  # ms, differences below this are noise
+
+# name: (config changes, keyboard modifiers when the language is chosen)
+COMBINATIONS = {
+    "default": ({}, 0),
+    "linenos": ({"linenos": True}, 0),
+    "center+font": ({"centerfragments": True, "font": "Consolas"}, 0),
+    "cssclasses": ({"cssclasses": True}, 0),
+    "style block": ({"style block instead of inline styles": True}, 0),
+    "compact": ({"compact html": True}, 0),
+    "inline": ({}, standins.Qt.MetaModifier),
+}
+CSS_STYLES = ("default", "monokai", "solarized-dark")
+
+
+def percentile(sorted_values, q):
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+def summary(timings, size):
+    timings = sorted(timings)
+    return {
+        "n": len(timings),
+        "p50": percentile(timings, 0.5),
+        "p90": percentile(timings, 0.9),
+        "p99": percentile(timings, 0.99),
+        "max": timings[-1],
+        "bytes": size,
+    }
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def load_addon(folder, config):
+    addon = os.path.join(folder, PACKAGE)
+    shutil.copytree(SRC, addon, ignore=shutil.ignore_patterns("__pycache__", "user_files"))
+    mw = standins.install(os.path.join(folder, "profile"), config)
+    standins.install_forms(PACKAGE)
+    sys.path.insert(0, folder)
+    importlib.import_module(PACKAGE)
+    standins.runHook("profileLoaded")
+    return mw
+
+
+def add_notes(mw, count=500):
+    # so that the css file contains more than one style, see styles_in_use.py
+    for nid in range(1, count + 1):
+        style = CSS_STYLES[nid % len(CSS_STYLES)]
+        mw.col.db.add_note(nid, f'<table class="shf__{style}__highlighttable">..</table>')
+
+
+def snippets(languages, sizes):
+    from pygments.lexers import get_lexer_for_filename
+    for name in sorted(os.listdir(CORPUS)):
+        path = os.path.join(CORPUS, name)
+        if not os.path.isfile(path):
+            continue
+        alias = get_lexer_for_filename(name).aliases[0]
+        if languages and alias not in languages and os.path.splitext(name)[1][1:] not in languages:
+            continue
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        for size in sizes:
+            code = "\n".join(lines[i % len(lines)] for i in range(size)) + "\n"
+            yield alias, size, code
+
+
+def bench_hilcd(sh, mw, config, languages, sizes, repeat):
+    results = {}
+    base = dict(config)
+    for alias, size, code in snippets(languages, sizes):
+        for combination, (changes, modifiers) in COMBINATIONS.items():
+            if size >= LARGE_LINES and combination != "default":
+                continue
+            config.clear()
+            config.update(base, **changes)
+            sh.on_config_changed()
+            mw.app.modifiers = modifiers
+            timings = []
+            size_out = 0
+            # the first run loads the lexer and builds the formatter
+            for run in range(1 + (1 if size >= LARGE_LINES else repeat)):
+                ed = standins.Editor(mw)
+                ms, _ = timed(run_hilcd, sh, ed, code, alias)
+                size_out = sum(len(h.encode("utf-8")) for h in ed.web.html) + len(ed.note.fields[0])
+                if run:
+                    timings.append(ms)
+            results[f"hilcd/{combination}/{alias}/{size}"] = summary(timings, size_out)
+    config.clear()
+    config.update(base)
+    sh.on_config_changed()
+    mw.app.modifiers = 0
+    return results
+
+
+def run_hilcd(sh, ed, code, alias):
+    sh.hilcd(ed, code, alias)
+    standins.process_events()
+
+
+def bench_leading_spaces(sh, languages, sizes, repeat):
+    results = {}
+    for alias, size, code in snippets(languages, sizes):
+        indented = "".join("    " + line + "\n" for line in code.splitlines())
+        timings = []
+        for _ in range(1 if size >= LARGE_LINES else repeat):
+            ms, out = timed(sh.remove_leading_spaces, indented)
+            timings.append(ms)
+        results[f"remove_leading_spaces/{alias}/{size}"] = summary(timings, len(out.encode("utf-8")))
+    return results
+
+
+def bench_helper_menu(sh, mw, languages, sizes, repeat):
+    # a paste of indented code, the menu isn't shown by the stand-ins
+    results = {}
+    for alias, size, code in snippets(languages, sizes):
+        indented = "".join("    " + line + "\n" for line in code.splitlines())
+        timings = []
+        # the first run imports what the menu needs
+        for run in range(1 + (1 if size >= LARGE_LINES else repeat)):
+            ms, _ = timed(sh._openHelperMenu, standins.Editor(mw), indented, False)
+            if run:
+                timings.append(ms)
+        results[f"helper menu/{alias}/{size}"] = summary(timings, None)
+    return results
+
+
+def bench_css(sh, repeat):
+    # the add-on has css templates for the styles of the pygments version in its libs folder
+    styles = sorted(n[:-len(".css")] for n in os.listdir(sh.css_templates_folder) if n.endswith(".css"))
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        for style in styles:
+            sh._css_for_style.cache_clear()
+            ms, css = timed(sh.css_for_style, style)
+            timings.append(ms)
+            size += len(css.encode("utf-8"))
+    results = {"css_for_style/all styles": summary(timings, size // repeat)}
+    for style in CSS_STYLES:
+        timings = []
+        for _ in range(repeat):
+            sh._css_for_style.cache_clear()
+            if os.path.exists(sh.css_file_in_media):
+                os.remove(sh.css_file_in_media)
+            ms, (_, after) = timed(sh.update_cssfile_in_mediafolder, style)
+            timings.append(ms)
+        results[f"update_cssfile_in_mediafolder/{style}"] = summary(timings, after)
+    return results
+
+
+def bench_filter_dialog(fuzzy_panel, lang_map, repeat):
+    results = {}
+    for name, values in (("languages", lang_map), ("20k decks", make_keys(20000))):
+        dialog = fuzzy_panel.FilterDialog(values=values)
+        timings = []
+        for _ in range(repeat):
+            for query in TYPED:
+                for end in range(len(query) + 1):
+                    dialog.input_line.setText(query[:end])
+                    ms, _ = timed(dialog.apply_filter)
+                    timings.append(ms)
+        results[f"FilterDialog.apply_filter/{name}"] = summary(timings, None)
+    return results
+
+
+def report(results):
+    print(f"{'benchmark':<52}{'n':>5}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'bytes':>11}")
+    for key, r in results.items():
+        print(f"{key:<52}{r['n']:>5}{r['p50']:>10.2f}{r['p90']:>10.2f}{r['p99']:>10.2f}"
+              f"{r['max']:>10.2f}{'-' if r['bytes'] is None else r['bytes']:>11}")
+
+
+def compare(results, baseline, tolerance):
+    """returns the number of regressions"""
+    regressions = 0
+    for key, r in results.items():
+        if key not in baseline:
+            continue
+        b = baseline[key]
+        notes = []
+        if r["p50"] > b["p50"] * (1 + tolerance) and r["p50"] - b["p50"] > ABSOLUTE_SLACK:
+            notes.append(f"slower: p50 {b['p50']:.2f} -> {r['p50']:.2f} ms")
+        if r["bytes"] is not None and b["bytes"] is not None and r["bytes"] > b["bytes"] * 1.01:
+            notes.append(f"larger: {b['bytes']} -> {r['bytes']} bytes")
+        if notes:
+            regressions += 1
+            print(f"REGRESSION {key}: " + ", ".join(notes))
+        elif r["p50"] < b["p50"] * (1 - tolerance) and b["p50"] - r["p50"] > ABSOLUTE_SLACK:
+            print(f"faster     {key}: p50 {b['p50']:.2f} -> {r['p50']:.2f} ms")
+    missing = [key for key in baseline if key not in results]
+    if missing:
+        print(f"{len(missing)} benchmarks of the baseline weren't run")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sizes", default="10,100,1000,10000,50000", help="lines per snippet")
+    parser.add_argument("--languages", default="", help="aliases or file extensions, default: all")
+    parser.add_argument("--baseline", default=os.path.join(BENCHMARKS, "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown of the p50")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+    languages = set(args.languages.split(",")) - {""}
+
+    with open(os.path.join(SRC, "config.json"), encoding="utf-8") as f:
+        config = json.load(f)
+    config["snippet cache size in MB"] = 0
+    with tempfile.TemporaryDirectory() as folder:
+        mw = load_addon(folder, config)
+        add_notes(mw)
+        sh = importlib.import_module(PACKAGE + ".syntax_highlighting")
+        fuzzy_panel = importlib.import_module(PACKAGE + ".fuzzy_panel")
+        results = {}
+        results.update(bench_hilcd(sh, mw, config, languages, sizes, args.repeat))
+        results.update(bench_leading_spaces(sh, languages, sizes, args.repeat))
+        results.update(bench_helper_menu(sh, mw, languages, sizes, args.repeat))
+        results.update(bench_css(sh, args.repeat))
+        results.update(bench_filter_dialog(fuzzy_panel, sh.lang_map(), args.repeat))
+    report(results)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=1, sort_keys=True)
+        print(f"saved the baseline in {args.baseline}")
+        return
+    try:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    except OSError:
+        print(f"no baseline in {args.baseline}, use --save-baseline to make one")
+        return
+    if compare(results, baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Measures how much smaller the html of the snippets in benchmarks/corpus gets with the
+compact output of SnippetFormatter (see src/highlighter.py), with css classes and with
+inline styles (the default of the add-on).
+
+It also checks that the compact html looks the same: every character of the code must
+get the same style as before. For whitespace only the properties that are visible on
+whitespace count.
+
+    python benchmarks/compact_output.py [style]
+"""
+
+import os
+import sys
+from html.parser import HTMLParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pygments.lexers import get_lexer_for_filename  # noqa: E402
+
+from highlighter import get_formatter, render_snippet  # noqa: E402
+
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+CSS_CLASS = "shf__{}__highlight"
+INVISIBLE_ON_WHITESPACE = ("color", "font-weight", "font-style")
+
+
+class StyledText(HTMLParser):
+    """the characters of the code with the style of the innermost span around them"""
+    def __init__(self, class_styles):
+        super().__init__()
+        self.class_styles = class_styles
+        self.spans = []
+        self.chars = []
+        self.in_code = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "code":
+            self.in_code = True
+        elif tag == "br" and self.in_code:
+            self.chars.append(("\n", ""))
+        elif tag == "span" and self.in_code:
+            if "style" in attrs:
+                self.spans.append(attrs["style"])
+            else:
+                classes = attrs.get("class", "").split()
+                self.spans.append(self.class_styles.get(classes[-1], "") if classes else "")
+
+    def handle_endtag(self, tag):
+        if tag == "code":
+            self.in_code = False
+        elif tag == "span" and self.in_code:
+            self.spans.pop()
+
+    def handle_data(self, data):
+        if not self.in_code:
+            return
+        style = self.spans[-1] if self.spans else ""
+        on_whitespace = "; ".join(d for d in style.split("; ")
+                                  if d and not d.startswith(INVISIBLE_ON_WHITESPACE))
+        for char in data:
+            self.chars.append((char, on_whitespace if char.isspace() else style))
+
+
+def corpus_files():
+    # compileall puts a __pycache__ next to sample.py
+    return sorted(n for n in os.listdir(CORPUS) if os.path.isfile(os.path.join(CORPUS, n)))
+
+
+def styled_text(html, formatter):
+    parser = StyledText({cls: style for cls, (style, _, _) in formatter.class2style.items()})
+    parser.feed(html)
+    return parser.chars
+
+
+def main():
+    style = sys.argv[1] if len(sys.argv) > 1 else "default"
+    totals = {}
+    print(f"{'file':<14}{'mode':<10}{'code':>8}{'html':>9}{'compact':>9}{'saved':>8}")
+    for name in corpus_files():
+        with open(os.path.join(CORPUS, name), encoding="utf-8") as f:
+            code = f.read()
+        lexer = get_lexer_for_filename(name, stripall=False)
+        for noclasses in (False, True):
+            mode = "inline" if noclasses else "classes"
+            css_class = CSS_CLASS.format(style)
+            sizes = []
+            texts = []
+            for compact in (False, True):
+                formatter = get_formatter(style, False, css_class, "", noclasses, compact=compact)
+                html = render_snippet(code, lexer, formatter, inline=False, linenos=False,
+                                      centerfragments=False, noclasses=noclasses, css_class=css_class)
+                sizes.append(len(html.encode("utf-8")))
+                texts.append(styled_text(html, formatter))
+            assert texts[0] == texts[1], f"{name} ({mode}) looks different"
+            before, after = sizes
+            totals.setdefault(mode, [0, 0])
+            totals[mode][0] += before
+            totals[mode][1] += after
+            print(f"{name:<14}{mode:<10}{len(code.encode('utf-8')):>8}{before:>9}{after:>9}"
+                  f"{1 - after / before:>8.1%}")
+    for mode, (before, after) in totals.items():
+        print(f"{'all':<14}{mode:<10}{'':>8}{before:>9}{after:>9}{1 - after / before:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
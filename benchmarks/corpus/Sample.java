@@ -0,0 +1,37 @@
+import java.util.ArrayList;
+import java.util.HashMap;
+import java.util.List;
+import java.util.Map;
+
+public class Sample {
+    private final Map<String, List<Integer>> index = new HashMap<>();
+
+    public void add(String word, int line) {
+        index.computeIfAbsent(word.toLowerCase(), k -> new ArrayList<>()).add(line);
+    }
+
+    public List<Integer> lookup(String word) {
+        return index.getOrDefault(word.toLowerCase(), List.of());
+    }
+
+    @Override
+    public String toString() {
+        StringBuilder sb = new StringBuilder();
+        for (Map.Entry<String, List<Integer>> e : index.entrySet()) {
+            sb.append(e.getKey()).append(": ").append(e.getValue()).append('\n');
+        }
+        return sb.toString();
+    }
+
+    public static void main(String[] args) {
+        Sample s = new Sample();
+        String[] lines = {"the quick brown fox", "jumps over the lazy dog"};
+        for (int i = 0; i < lines.length; i++) {
+            for (String w : lines[i].split("\\s+")) {
+                s.add(w, i + 1);
+            }
+        }
+        System.out.println(s.lookup("the"));
+        System.out.print(s);
+    }
+}
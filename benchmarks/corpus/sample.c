@@ -0,0 +1,45 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+typedef struct node {
+    int key;
+    struct node *left, *right;
+} node;
+
+static node *insert(node *root, int key)
+{
+    if (root == NULL) {
+        node *n = malloc(sizeof *n);
+        if (n == NULL) {
+            perror("malloc");
+            exit(EXIT_FAILURE);
+        }
+        n->key = key;
+        n->left = n->right = NULL;
+        return n;
+    }
+    if (key < root->key)
+        root->left = insert(root->left, key);
+    else if (key > root->key)
+        root->right = insert(root->right, key);
+    return root;
+}
+
+static void print_inorder(const node *root)
+{
+    if (root == NULL)
+        return;
+    print_inorder(root->left);
+    printf("%d\n", root->key);
+    print_inorder(root->right);
+}
+
+int main(int argc, char **argv)
+{
+    node *root = NULL;
+    for (int i = 1; i < argc; i++)
+        root = insert(root, atoi(argv[i]));
+    print_inorder(root);
+    return 0;
+}
@@ -0,0 +1,23 @@
+module Main where
+
+import qualified Data.Map.Strict as Map
+import Data.Char (isAlpha, toLower)
+import Data.List (sortBy)
+import Data.Ord (comparing, Down (..))
+
+-- | count how often each word occurs
+wordCounts :: String -> Map.Map String Int
+wordCounts = foldr add Map.empty . words . map normalize
+  where
+    normalize c
+      | isAlpha c = toLower c
+      | otherwise = ' '
+    add w = Map.insertWith (+) w 1
+
+top :: Int -> Map.Map String Int -> [(String, Int)]
+top n = take n . sortBy (comparing (Down . snd)) . Map.toList
+
+main :: IO ()
+main = do
+  text <- getContents
+  mapM_ (\(w, c) -> putStrLn (show c ++ " " ++ w)) (top 10 (wordCounts text))
@@ -0,0 +1,43 @@
+const API = "https://example.org/api/v1";
+
+async function fetchJson(path, options = {}) {
+  const response = await fetch(`${API}/${path}`, {
+    headers: { "Content-Type": "application/json" },
+    ...options,
+  });
+  if (!response.ok) {
+    throw new Error(`request failed: ${response.status}`);
+  }
+  return response.json();
+}
+
+class TodoList {
+  constructor(element) {
+    this.element = element;
+    this.items = [];
+  }
+
+  async load() {
+    this.items = await fetchJson("todos");
+    this.render();
+  }
+
+  toggle(id) {
+    const item = this.items.find((i) => i.id === id);
+    if (item) {
+      item.done = !item.done;
+      this.render();
+    }
+  }
+
+  render() {
+    this.element.innerHTML = this.items
+      .map((i) => `<li class="${i.done ? "done" : ""}">${i.title}</li>`)
+      .join("");
+  }
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+  const list = new TodoList(document.querySelector("#todos"));
+  list.load().catch(console.error);
+});
@@ -0,0 +1,39 @@
+import collections
+import re
+
+
+word = re.compile(r"[a-z']+")
+
+
+class Index:
+    """maps words to the lines they appear in"""
+
+    def __init__(self, lines):
+        self.lines = list(lines)
+        self.words = collections.defaultdict(set)
+        for number, line in enumerate(self.lines, start=1):
+            for w in word.findall(line.lower()):
+                self.words[w].add(number)
+
+    def search(self, query, limit=10):
+        terms = word.findall(query.lower())
+        if not terms:
+            return []
+        found = set.intersection(*(self.words.get(t, set()) for t in terms))
+        return [self.lines[n - 1] for n in sorted(found)[:limit]]
+
+
+def main(path="example.txt"):
+    with open(path, encoding="utf-8") as f:
+        index = Index(f)
+    while True:
+        try:
+            query = input("> ")
+        except EOFError:
+            break
+        for line in index.search(query):
+            print(f"  {line.rstrip()}")
+
+
+if __name__ == "__main__":
+    main()
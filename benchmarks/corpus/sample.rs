@@ -0,0 +1,38 @@
+use std::collections::HashMap;
+use std::io::{self, BufRead};
+
+#[derive(Debug, Default)]
+struct Stats {
+    lines: usize,
+    words: usize,
+    counts: HashMap<String, usize>,
+}
+
+impl Stats {
+    fn add_line(&mut self, line: &str) {
+        self.lines += 1;
+        for word in line.split_whitespace() {
+            self.words += 1;
+            *self.counts.entry(word.to_lowercase()).or_insert(0) += 1;
+        }
+    }
+
+    fn top(&self, n: usize) -> Vec<(&String, &usize)> {
+        let mut v: Vec<_> = self.counts.iter().collect();
+        v.sort_by(|a, b| b.1.cmp(a.1).then(a.0.cmp(b.0)));
+        v.truncate(n);
+        v
+    }
+}
+
+fn main() -> io::Result<()> {
+    let mut stats = Stats::default();
+    for line in io::stdin().lock().lines() {
+        stats.add_line(&line?);
+    }
+    println!("{} lines, {} words", stats.lines, stats.words);
+    for (word, count) in stats.top(10) {
+        println!("{:>8} {}", count, word);
+    }
+    Ok(())
+}
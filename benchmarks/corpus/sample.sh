@@ -0,0 +1,23 @@
+#!/usr/bin/env bash
+# back up the given folders into dated tarballs and keep the last 7
+set -euo pipefail
+
+dest="${BACKUP_DIR:-$HOME/backups}"
+keep=7
+
+mkdir -p "$dest"
+for dir in "$@"; do
+    if [[ ! -d "$dir" ]]; then
+        echo "skipping $dir: not a directory" >&2
+        continue
+    fi
+    name="$(basename "$dir")"
+    archive="$dest/${name}-$(date +%Y-%m-%d).tar.gz"
+    tar -czf "$archive" -C "$(dirname "$dir")" "$name"
+    echo "wrote $archive ($(du -h "$archive" | cut -f1))"
+
+    # remove old backups of this folder
+    ls -1t "$dest/${name}-"*.tar.gz | tail -n +$((keep + 1)) | while read -r old; do
+        rm -- "$old"
+    done
+done
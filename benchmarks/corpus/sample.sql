@@ -0,0 +1,30 @@
+-- monthly revenue per customer with a running total
+WITH monthly AS (
+    SELECT c.id AS customer_id,
+           c.name,
+           date_trunc('month', o.created_at) AS month,
+           SUM(oi.quantity * oi.unit_price) AS revenue
+    FROM customers c
+    JOIN orders o ON o.customer_id = c.id
+    JOIN order_items oi ON oi.order_id = o.id
+    WHERE o.status <> 'cancelled'
+      AND o.created_at >= DATE '2020-01-01'
+    GROUP BY c.id, c.name, date_trunc('month', o.created_at)
+)
+SELECT customer_id,
+       name,
+       month,
+       revenue,
+       SUM(revenue) OVER (PARTITION BY customer_id ORDER BY month) AS running_total,
+       RANK() OVER (PARTITION BY month ORDER BY revenue DESC) AS rank_in_month
+FROM monthly
+WHERE revenue > 0
+ORDER BY month, rank_in_month
+LIMIT 100;
+
+CREATE INDEX IF NOT EXISTS orders_customer_created
+    ON orders (customer_id, created_at);
+
+UPDATE customers
+SET last_order_at = (SELECT MAX(created_at) FROM orders WHERE orders.customer_id = customers.id)
+WHERE id IN (SELECT DISTINCT customer_id FROM orders);
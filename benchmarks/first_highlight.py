@@ -0,0 +1,83 @@
+"""
+Measures the first and the second hilcd of a session with and without the warm-up of
+prewarm.py. Each measurement runs in a new python process that imports the add-on with
+the stand-ins (see standins.py) and runs the profileLoaded hook:
+- cold: hilcd right after the hook, i.e. before the warm-up thread starts (hilcd
+  stops it),
+- warm: hilcd after the warm-up thread is done.
+
+    python benchmarks/first_highlight.py [--repeat N] [--languages Python,SQL]
+
+The languages are set as default language and favorites, each is highlighted with a
+snippet from benchmarks/corpus.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(BENCHMARKS, "..", "src")
+
+CHILD = r"""
+import importlib, json, os, shutil, sys, tempfile, time
+sys.path.insert(0, {benchmarks!r})
+import standins
+from addon_suite import CORPUS, PACKAGE, load_addon
+languages = {languages!r}
+with open(os.path.join({src!r}, "config.json"), encoding="utf-8") as f:
+    config = json.load(f)
+config.update({{"defaultlang": languages[0], "favorites": languages, "snippet cache size in MB": 0}})
+folder = tempfile.mkdtemp()
+mw = load_addon(folder, config)
+sh = importlib.import_module(PACKAGE + ".syntax_highlighting")
+prewarm = importlib.import_module(PACKAGE + ".prewarm")
+if {warm!r}:
+    prewarm._thread.join()
+from pygments.lexers import get_lexer_for_filename
+langs = sh.lang_map()
+samples = {{}}
+for name in sorted(os.listdir(CORPUS)):
+    if os.path.isfile(os.path.join(CORPUS, name)):
+        with open(os.path.join(CORPUS, name), encoding="utf-8") as f:
+            samples.setdefault(get_lexer_for_filename(name).aliases[0], f.read())
+times = {{}}
+for language in languages:
+    alias = langs[language]
+    for run in ("first", "second"):
+        start = time.perf_counter()
+        sh.hilcd(standins.Editor(mw), samples.get(alias, "x = 1\n"), alias)
+        standins.process_events()
+        times[language + " " + run] = (time.perf_counter() - start) * 1000
+print(json.dumps(times))
+shutil.rmtree(folder)
+"""
+
+
+def run_once(languages, warm):
+    code = CHILD.format(benchmarks=BENCHMARKS, src=os.path.abspath(SRC), languages=languages, warm=warm)
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--languages", default="Python,Transact-SQL,C,Rust",
+                        help="language names as in the menu")
+    args = parser.parse_args()
+    languages = args.languages.split(",")
+    results = {}
+    for warm in (False, True):
+        runs = [run_once(languages, warm) for _ in range(args.repeat)]
+        results[warm] = {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+    print(f"{'hilcd (median of %d processes)' % args.repeat:<40}{'cold ms':>10}{'warm ms':>10}")
+    for key in results[False]:
+        print(f"{key:<40}{results[False][key]:>10.1f}{results[True][key]:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Replays typed queries against 20k keys and reports the latency per keystroke of the
+search behind the FilterDialog (src/fuzzy_search.py).
+
+    python benchmarks/fuzzy_search_typing.py [number of keys]
+
+Compared are:
+- scan:        checking every key on every keystroke (how the dialog worked before the index)
+- index:       SearchIndex.search as used by the dialog for the "slzk_mod" method
+- ranked:      SearchIndex.rank (fuzzy matching, best matches first), the default method,
+               plus the first 100 other matches that the list in the dialog loads at first.
+               It narrows down the candidates of the previous keystroke.
+- reopened:    ranked again with the same index, like a dialog that is opened again for
+               the same keys (see index_for)
+Each method except reopened starts with a new SearchIndex, i.e. the sets that a query
+needs are built during the first keystrokes like in a dialog that was just opened.
+"""
+
+import itertools
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from fuzzy_search import SearchIndex, split_search_terms_withStart  # noqa: E402
+
+
+WORDS = ("Languages Japanese Spanish Vocab Kanji Grammar CS Python Async Algorithms "
+         "Data Structures Math Linear Algebra Calculus Physics Chemistry Biology History "
+         "Medicine Anatomy Pharmacology Geography Capitals Music Theory Law Contracts").split()
+
+TYPED = [
+    "python",
+    "python async",
+    "_Lang jap !vocab",
+    "algebra lin",
+    '"data structures" 12',
+    "Kanji",
+    "pharm anat",
+]
+
+
+def make_keys(count, seed=1):
+    rng = random.Random(seed)
+    keys = set()
+    while len(keys) < count:
+        parts = [rng.choice(WORDS) + (str(rng.randint(1, 40)) if rng.random() < 0.3 else "")
+                 for _ in range(rng.randint(1, 5))]
+        keys.add("::".join(parts))
+    return sorted(keys)
+
+
+def scan(keys, search_string):
+    terms = split_search_terms_withStart(search_string)
+    results = []
+    for key in keys:
+        for presence, atstart, term in terms:
+            i = key.lower() if term.islower() else key
+            if presence:
+                if term not in i or (atstart and not i.startswith(term)):
+                    break
+            elif term in i:
+                break
+        else:
+            results.append(key)
+    return results
+
+
+def replay(search):
+    timings = []
+    for query in TYPED:
+        for end in range(len(query) + 1):
+            start = time.perf_counter()
+            search(query[:end])
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<12} median {statistics.median(timings):6.2f} ms   "
+          f"p95 {p95:6.2f} ms   max {timings[-1]:6.2f} ms")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    keys = make_keys(count)
+    start = time.perf_counter()
+    index = SearchIndex(keys)
+    print(f"{count} keys, index built in {(time.perf_counter() - start) * 1000:.0f} ms, "
+          f"{sum(len(q) + 1 for q in TYPED)} keystrokes")
+
+    report("scan", replay(lambda q: scan(keys, q)))
+    report("index", replay(index.search))
+
+    def ranked(q):
+        top, rest = index.rank(q)
+        return top + list(itertools.islice(rest, 100))
+    index = SearchIndex(keys)
+    report("ranked", replay(ranked))
+    report("reopened", replay(ranked))
+
+    # the search with the index must give the same results as the scan
+    for query in TYPED:
+        for end in range(len(query) + 1):
+            assert index.filter(query[:end]) == scan(keys, query[:end]), query[:end]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Measures how much the add-on adds to the startup of Anki: the add-on is imported with
+the stand-ins from standins.py (so aqt and anki cost nothing) and the profileLoaded hook
+is run, like when Anki starts. This runs in a new python process with "-X importtime"
+and the cumulative import times of the modules of the add-on and of the libraries that
+they pull in are printed, together with the wall time of the import and of the hook.
+
+    python benchmarks/import_time.py [--repeat N] [--all]
+
+--all prints every module that took more than 1 ms instead of the summary.
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(BENCHMARKS, "..", "src")
+
+# runs in the child process, see addon_suite.load_addon
+CHILD = r"""
+import json, os, shutil, sys, tempfile, time, importlib
+sys.path.insert(0, {benchmarks!r})
+import standins
+package = "syntax_highlighting_addon"
+folder = tempfile.mkdtemp()
+shutil.copytree({src!r}, os.path.join(folder, package),
+                ignore=shutil.ignore_patterns("__pycache__", "user_files"))
+with open(os.path.join({src!r}, "config.json"), encoding="utf-8") as f:
+    config = json.load(f)
+standins.install(os.path.join(folder, "profile"), config)
+standins.install_forms(package)
+sys.path.insert(0, folder)
+start = time.perf_counter()
+importlib.import_module(package)
+imported = time.perf_counter()
+standins.runHook("profileLoaded")
+loaded = time.perf_counter()
+print("WALL", (imported - start) * 1000, (loaded - imported) * 1000, file=sys.stderr)
+shutil.rmtree(folder)
+"""
+
+line = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+LIBRARIES = ("pygments", "bs4", "sqlite3", "concurrent", "json", "typing")
+
+
+def run_once():
+    code = CHILD.format(benchmarks=BENCHMARKS, src=os.path.abspath(SRC))
+    # compiled files of an earlier run would make the first import faster than the others
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, env=env, check=True)
+    modules = {}  # name: (cumulative us, depth)
+    wall = None
+    for l in proc.stderr.splitlines():
+        m = line.match(l)
+        if m:
+            modules[m.group(4)] = (int(m.group(2)), len(m.group(3)) // 2)
+        elif l.startswith("WALL"):
+            wall = tuple(float(v) for v in l.split()[1:])
+    return modules, wall
+
+
+def summary(modules):
+    result = {}
+    for name, (cumulative, _) in modules.items():
+        if name.startswith("syntax_highlighting_addon"):
+            result[name.replace("syntax_highlighting_addon", "addon", 1)] = cumulative
+        elif name in LIBRARIES:
+            result[name] = cumulative
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--all", action="store_true")
+    args = parser.parse_args()
+    runs = [run_once() for _ in range(args.repeat)]
+    if args.all:
+        modules, _ = runs[-1]
+        for name, (cumulative, depth) in modules.items():
+            if cumulative >= 1000:
+                print(f"{cumulative / 1000:9.1f} ms  {'  ' * depth}{name}")
+        return
+    summaries = [summary(modules) for modules, _ in runs]
+    names = sorted({n for s in summaries for n in s}, key=lambda n: -summaries[-1].get(n, 0))
+    print(f"{'module (cumulative, median of %d runs)' % args.repeat:<48}{'ms':>8}")
+    for name in names:
+        values = [s.get(name, 0) for s in summaries]
+        print(f"{name:<48}{statistics.median(values) / 1000:>8.1f}")
+    print(f"{'wall time of the import':<48}{statistics.median(w[0] for _, w in runs):>8.1f}")
+    print(f"{'wall time of the profileLoaded hook':<48}{statistics.median(w[1] for _, w in runs):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
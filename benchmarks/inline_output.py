@@ -0,0 +1,102 @@
+"""
+Compares two ways to make the html for inline snippets (the Meta modifier in hilcd):
+
+- replace:  the normal block output of pygments (<div><pre>..</pre></div>) turned into
+            <span><code>..</code></span> by the chain of str.replace calls that
+            render_snippet used before
+- inline:   SnippetFormatter(inline=True) that writes the <span><code> directly,
+            see src/highlighter.py
+
+Reported are the median time and the peak of the memory allocated while the html is
+made (tracemalloc), for a typical one-liner and for longer code. The code is lexed once
+beforehand because the lexer takes the same time in both cases.
+
+    python benchmarks/inline_output.py [repetitions]
+"""
+
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pygments.formatters import HtmlFormatter  # noqa: E402
+
+from highlighter import get_formatter, get_lexer, highlight, render_snippet  # noqa: E402
+
+
+ONE_LINER = "sorted(words, key=lambda w: (len(w), w.lower()))[:10]"
+CSS_CLASS = "shf__monokai__highlight"
+
+
+class Lexed:
+    """stands in for the lexer and returns the tokens that the lexer made once"""
+    def __init__(self, lexer, code):
+        self.aliases = lexer.aliases
+        self.tokens = list(lexer.get_tokens(code))
+
+    def get_tokens(self, code):
+        return iter(self.tokens)
+
+
+def replace_chain(code, lexer, formatter, noclasses):
+    """render_snippet for inline snippets before SnippetFormatter"""
+    pygmntd = highlight(code, lexer, formatter).rstrip()
+    if noclasses:
+        pygmntd = pygmntd.replace('line-height: 125%;', '')
+    pretty_code = "".join([pygmntd, "<br>"])
+    replacements = {
+        '<div class=': '<span class=',
+        "<pre": "<code",
+        "</pre></div>": "</code></span>",
+        "<br>": "",
+        "</br>": "",
+        "</ br>": "",
+        "<br />": "",
+        'style="line-height: 125%"': '',
+    }
+    for k, v in replacements.items():
+        pretty_code = pretty_code.replace(k, v)
+    tagend = pretty_code.index(" ")
+    return f'{pretty_code[:tagend]} data-shf-lang="{lexer.aliases[0]}"{pretty_code[tagend:]}'
+
+
+def measure(make, repetitions):
+    timings = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        make()
+        timings.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    make()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "highlighter.py"),
+              encoding="utf-8") as f:
+        long_code = f.read()
+    lexer = get_lexer("python", False)
+    for noclasses in (False, True):
+        old = HtmlFormatter(cssclass=CSS_CLASS, cssstyles="text-align: left;", font_size=16,
+                            lineseparator="<br>", noclasses=noclasses, style="monokai", wrapcode=True)
+        new = get_formatter("monokai", False, CSS_CLASS, "text-align: left;", noclasses, inline=True)
+        for name, code in (("one-liner", ONE_LINER), (f"{len(long_code) // 1000} KB", long_code)):
+            print(f"noclasses={noclasses!s:<5} {name}")
+            lexed = Lexed(lexer, code)
+            for method, make in (
+                    ("replace", lambda: replace_chain(code, lexed, old, noclasses)),
+                    ("inline", lambda: render_snippet(code, lexed, new, inline=True, linenos=False,
+                                                      centerfragments=False, noclasses=noclasses,
+                                                      css_class=CSS_CLASS))):
+                median, peak = measure(make, repetitions)
+                print(f"  {method:<8} median {median:8.3f} ms   peak {peak / 1024:8.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Minimal stand-ins for aqt, anki, mw, the editor and the addon manager so that the add-on
+can be imported and driven outside of Anki (and without PyQt), see addon_suite.py.
+
+They only do what the add-on needs:
+- every Qt class is a Stub: unknown attributes and calls return a Stub (which is false),
+  except for QTimer, QLineEdit and pyqtSignal which keep their state,
+- QTimer doesn't run by itself, process_events() fires the active timers until none is
+  left (e.g. the poll timer of a background highlighting job, see highlight_job.py),
+- mw.col.db is a sqlite database in memory with a notes table,
+- mw.col.decks keeps the decks in a dict (the add-on wraps the methods of DeckManager),
+- Editor.web records the html that the add-on inserts.
+
+install() must be called before the add-on is imported.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import types
+
+
+class StubMeta(type):
+    def __getattr__(cls, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return Stub()
+
+
+class Stub(metaclass=StubMeta):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return Stub()
+
+    def __call__(self, *args, **kwargs):
+        return Stub()
+
+    def __bool__(self):
+        return False
+
+    def __iter__(self):
+        return iter(())
+
+
+class QtMeta(type):
+    def __getattr__(cls, name):
+        return 0
+
+
+class Qt(metaclass=QtMeta):
+    NoModifier = 0
+    ShiftModifier = 0x02000000
+    ControlModifier = 0x04000000
+    AltModifier = 0x08000000
+    MetaModifier = 0x10000000
+
+
+class Signal:
+    def __init__(self, *types_):
+        self.slots = []
+
+    def connect(self, slot):
+        self.slots.append(slot)
+
+    def disconnect(self, slot=None):
+        self.slots = [] if slot is None else [s for s in self.slots if s != slot]
+
+    def emit(self, *args):
+        for slot in list(self.slots):
+            slot(*args)
+
+
+class pyqtSignal:
+    """descriptor like in PyQt: each instance gets its own Signal"""
+    def __set_name__(self, owner, name):
+        self.name = "_signal_" + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        if self.name not in obj.__dict__:
+            obj.__dict__[self.name] = Signal()
+        return obj.__dict__[self.name]
+
+
+_timers = set()
+
+
+class QTimer(Stub):
+    def __init__(self, *args, **kwargs):
+        self.timeout = Signal()
+        self.single_shot = False
+        self.interval = 0
+        self.active = False
+
+    def setSingleShot(self, single_shot):
+        self.single_shot = single_shot
+
+    def setInterval(self, interval):
+        self.interval = interval
+
+    def start(self, interval=None):
+        if interval is not None:
+            self.interval = interval
+        self.active = True
+        _timers.add(self)
+
+    def stop(self):
+        self.active = False
+        _timers.discard(self)
+
+    def isActive(self):
+        return self.active
+
+
+def process_events(timeout=600):
+    """fires the active timers until there are none left"""
+    deadline = time.perf_counter() + timeout
+    while _timers:
+        if time.perf_counter() > deadline:
+            raise TimeoutError("timers are still active")
+        for timer in list(_timers):
+            if timer.single_shot:
+                timer.stop()
+            timer.timeout.emit()
+        time.sleep(0.001)
+
+
+class QLineEdit(Stub):
+    textChanged = pyqtSignal()
+    returnPressed = pyqtSignal()
+
+    def __init__(self, *args, **kwargs):
+        self._text = ""
+
+    def setText(self, text):
+        self._text = text
+        self.textChanged.emit()
+
+    def text(self):
+        return self._text
+
+
+QT_NAMES = """QAbstractListModel QAction QApplication QCoreApplication QCursor QDialog
+    QDialogButtonBox QEvent QFontDatabase QHBoxLayout QKeyEvent QKeySequence QLabel
+    QListView QListWidget QListWidgetItem QMenu QModelIndex QObject QProgressDialog
+    QPushButton QVBoxLayout QWidget QWidgetAction""".split()
+
+
+# the collection, the main window and the addon manager
+
+class DB:
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("create table notes (id integer primary key, mod integer, flds text)")
+
+    def execute(self, sql, *args):
+        return self.conn.execute(sql, args).fetchall()
+
+    def scalar(self, sql, *args):
+        row = self.conn.execute(sql, args).fetchone()
+        return row[0] if row else None
+
+    def list(self, sql, *args):
+        return [row[0] for row in self.conn.execute(sql, args)]
+
+    def add_note(self, nid, flds):
+        self.conn.execute("insert into notes values (?, ?, ?)", (nid, int(time.time()), flds))
+
+
+class DeckManager(Stub):
+    def __init__(self):
+        self.decks = {}  # id: deck
+
+    def all(self):
+        return list(self.decks.values())
+
+    def byName(self, name):
+        for deck in self.decks.values():
+            if deck["name"] == name:
+                return deck
+        return None
+
+    def id(self, name, create=True):
+        deck = self.byName(name)
+        if deck:
+            return deck["id"]
+        if not create:
+            return None
+        if "::" in name:
+            # like Anki: the parents are created, too
+            self.id(name.rsplit("::", 1)[0])
+        did = len(self.decks) + 1
+        self.decks[did] = {"id": did, "name": name}
+        return did
+
+    def rename(self, deck, newName):
+        # like Anki: the subdecks are renamed, too
+        old = deck["name"]
+        for other in self.decks.values():
+            if other["name"].startswith(old + "::"):
+                other["name"] = newName + other["name"][len(old):]
+        deck["name"] = newName
+
+    def rem(self, did, *args, **kwargs):
+        self.decks.pop(did, None)
+
+
+class Collection(Stub):
+    def __init__(self, folder):
+        self.path = os.path.join(folder, "collection.anki2")
+        self.db = DB()
+        self.decks = DeckManager()
+
+
+class ProfileManager(Stub):
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(os.path.join(folder, "collection.media"), exist_ok=True)
+
+    def profileFolder(self):
+        return self.folder
+
+
+class AddonManager(Stub):
+    def __init__(self, config):
+        self.config = config
+
+    def getConfig(self, module):
+        return self.config
+
+    def writeConfig(self, module, config):
+        self.config = config
+
+    def addonName(self, folder):
+        return "Syntax Highlighting"
+
+
+class App(Stub):
+    def __init__(self):
+        self.modifiers = 0
+
+    def keyboardModifiers(self):
+        return self.modifiers
+
+
+class MainWindow(Stub):
+    def __init__(self, folder, config):
+        self.addonManager = AddonManager(config)
+        self.pm = ProfileManager(folder)
+        self.col = Collection(folder)
+        self.app = App()
+
+
+# the editor
+
+inserted = re.compile(r"^(?:MyInsertHtml\(|setFormat\('inserthtml', |shfAddChunk\(\d+, )(.*)\);$", re.S)
+wrap_selection = re.compile(r"^wrap\('(.*)', '(.*)'\)$")
+
+
+class WebView(Stub):
+    def __init__(self, editor):
+        self.editor = editor
+        self.evals = 0
+        self.bridge_bytes = 0   # javascript sent to the webview
+        self.html = []          # html that the add-on inserted
+
+    def eval(self, js):
+        self.evals += 1
+        self.bridge_bytes += len(js.encode("utf-8"))
+        m = inserted.match(js)
+        if m:
+            self.html.append(json.loads(m.group(1)))
+        # supplementary.wrap_in_tags marks the selection in the field like this
+        m = wrap_selection.match(js)
+        if m:
+            self.editor.note.fields[self.editor.currentField] += m.group(1) + m.group(2)
+
+    def evalWithCallback(self, js, callback):
+        self.eval(js)
+        callback(None)
+
+
+class Note(Stub):
+    def __init__(self, fields):
+        self.fields = fields
+
+
+class Editor(Stub):
+    def __init__(self, mw):
+        self.mw = mw
+        self.web = WebView(self)
+        self.note = Note([""])
+        self.currentField = 0
+
+    def saveNow(self, callback, *args):
+        callback()
+
+
+# the modules
+
+_hooks = {}
+
+
+def addHook(name, func):
+    _hooks.setdefault(name, []).append(func)
+
+
+def runHook(name, *args):
+    for func in _hooks.get(name, []):
+        func(*args)
+
+
+def wrap(old, new, pos="after"):
+    def wrapped(*args, **kwargs):
+        if pos == "before":
+            new(*args, **kwargs)
+            return old(*args, **kwargs)
+        if pos == "around":
+            return new(*args, _old=old, **kwargs)
+        result = old(*args, **kwargs)
+        new(*args, **kwargs)
+        return result
+    return wrapped
+
+
+def module(name, **attributes):
+    mod = types.ModuleType(name)
+    mod.__dict__.update(attributes)
+    sys.modules[name] = mod
+    return mod
+
+
+def install(folder, config):
+    """puts aqt and anki into sys.modules, returns mw"""
+    mw = MainWindow(folder, config)
+    qt = {name: type(name, (Stub,), {}) for name in QT_NAMES}
+    qt.update(Qt=Qt, QTimer=QTimer, QLineEdit=QLineEdit, pyqtSignal=pyqtSignal)
+    aqt = module("aqt", mw=mw)
+    aqt.qt = module("aqt.qt", **qt)
+    aqt.utils = module("aqt.utils", askUser=lambda *a, **k: True, showInfo=Stub(),
+                       showWarning=Stub(), tooltip=Stub(), restoreGeom=Stub(), saveGeom=Stub())
+    aqt.editor = module("aqt.editor", Editor=Editor, _html="")
+    for name, cls in (("addcards", "AddCards"), ("browser", "Browser"), ("editcurrent", "EditCurrent")):
+        setattr(aqt, name, module("aqt." + name, **{cls: type(cls, (Stub,), {})}))
+    anki = module("anki")
+    anki.hooks = module("anki.hooks", addHook=addHook, runHook=runHook, wrap=wrap)
+    anki.decks = module("anki.decks", DeckManager=DeckManager)
+    anki.utils = module("anki.utils", json=json)
+    return mw
+
+
+def install_forms(package):
+    """the Qt Designer forms of the settings are only generated when the add-on is built"""
+    forms = module(package + ".forms")
+    for name in ("syntax_settings", "deck_default"):
+        setattr(forms, name, module(f"{package}.forms.{name}", Ui_Dialog=type("Ui_Dialog", (Stub,), {})))
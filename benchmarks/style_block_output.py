@@ -0,0 +1,66 @@
+"""
+Measures how much smaller the html of the snippets in benchmarks/corpus gets when the
+inline styles (the default of the add-on, "cssclasses" off) are replaced by a <style>
+block with short class names ("style block instead of inline styles", see SnippetFormatter
+in src/highlighter.py). Both with and without the compact html.
+
+Like compact_output.py it checks that every character keeps its style.
+
+    python benchmarks/style_block_output.py [style]
+"""
+
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pygments.lexers import get_lexer_for_filename  # noqa: E402
+
+from compact_output import CORPUS, CSS_CLASS, StyledText, corpus_files  # noqa: E402
+from highlighter import get_formatter, render_snippet  # noqa: E402
+
+
+rule = re.compile(r"\.shf\w+ \.([\w-]+)\{([^}]*)\}")
+
+
+def styled_text(html):
+    # the minified rules are turned back into the form of the inline styles
+    styles = {c: style.replace(":", ": ").replace(";", "; ") for c, style in rule.findall(html)}
+    parser = StyledText(styles)
+    parser.feed(html)
+    return parser.chars
+
+
+def render(code, lexer, style, compact, style_block):
+    css_class = CSS_CLASS.format(style)
+    formatter = get_formatter(style, False, css_class, "text-align: left;", True,
+                              compact=compact, style_block=style_block)
+    return render_snippet(code, lexer, formatter, inline=False, linenos=False,
+                          centerfragments=False, noclasses=True, css_class=css_class)
+
+
+def main():
+    style = sys.argv[1] if len(sys.argv) > 1 else "default"
+    totals = [0, 0, 0, 0]
+    print(f"{'file':<14}{'inline':>8}{'block':>8}{'saved':>8}"
+          f"{'compact':>10}{'block':>8}{'saved':>8}")
+    for name in corpus_files():
+        with open(os.path.join(CORPUS, name), encoding="utf-8") as f:
+            code = f.read()
+        lexer = get_lexer_for_filename(name, stripall=False)
+        sizes = []
+        for compact in (False, True):
+            inline = render(code, lexer, style, compact, False)
+            block = render(code, lexer, style, compact, True)
+            assert styled_text(inline) == styled_text(block), f"{name} looks different"
+            sizes += [len(inline.encode("utf-8")), len(block.encode("utf-8"))]
+        totals = [t + s for t, s in zip(totals, sizes)]
+        print(f"{name:<14}{sizes[0]:>8}{sizes[1]:>8}{1 - sizes[1] / sizes[0]:>8.1%}"
+              f"{sizes[2]:>10}{sizes[3]:>8}{1 - sizes[3] / sizes[2]:>8.1%}")
+    print(f"{'all':<14}{totals[0]:>8}{totals[1]:>8}{1 - totals[1] / totals[0]:>8.1%}"
+          f"{totals[2]:>10}{totals[3]:>8}{1 - totals[3] / totals[2]:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -77,3 +77,4 @@ This add-on bundles the pygments library which has this copyright and permission
 
 
 from . import syntax_highlighting
+from . import rehighlight_menu
@@ -1,4 +1,7 @@
 import os
+import re
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Tuple
 
 from aqt import mw
 
@@ -7,12 +10,86 @@ from aqt import mw
 user_files_folder = os.path.join(os.path.dirname(__file__), "user_files")
 
 
-def gc(arg, fail=False):
-    conf = mw.addonManager.getConfig(__name__)
-    if conf:
-        return conf.get(arg, fail)
-    else:
-        return fail
+class Config(NamedTuple):
+    """
+    The settings from config.json. getConfig reads and merges the json files of the add-on
+    on every call and hilcd needs about ten settings, so the settings are loaded once
+    into a Config and the whole Config is replaced when they change, see snapshot().
+    The attributes are the keys of config.json in lower case with "_" instead of spaces
+    and other characters. Values of the wrong type are replaced by the default here.
+    """
+    ask_before_inserting_snippets_larger_than_kb: float = 500
+    centerfragments: bool = False
+    compact_html: bool = False
+    cssclasses: bool = False
+    css_custom_class_per_style: bool = False
+    defaultlangperdeck: bool = False
+    deckdefaultlang: Mapping[str, str] = MappingProxyType({})
+    defaultlang: str = "Python"
+    favorites: Tuple[str, ...] = ()
+    fielddefaultlang: Mapping[str, Mapping[str, str]] = MappingProxyType({})
+    font: str = ""
+    hotkey: str = "Alt+s"
+    insert_snippets_larger_than_kb_without_highlighting: float = 5000
+    linenos: bool = False
+    notetypedefaultlang: Mapping[str, str] = MappingProxyType({})
+    remove_leading_spaces_if_possible: bool = True
+    show_pre_code: bool = True
+    snippet_cache_size_in_mb: float = 20
+    style: str = "default"
+    style_block_instead_of_inline_styles: bool = False
+
+
+def attribute_name(key):
+    return re.sub(r"\W+", "_", key).lower()
+
+
+def typed(value, default):
+    if isinstance(default, bool):
+        return bool(value) if isinstance(value, (bool, int)) else default
+    if isinstance(default, (int, float)):
+        ok = isinstance(value, (int, float)) and not isinstance(value, bool)
+        return value if ok else default
+    if isinstance(default, str):
+        return value if isinstance(value, str) else default
+    if isinstance(default, tuple):
+        ok = isinstance(value, (list, tuple))
+        return tuple(v for v in value if isinstance(v, str)) if ok else default
+    # a mapping
+    return MappingProxyType(dict(value)) if isinstance(value, dict) else default
+
+
+def load():
+    conf = mw.addonManager.getConfig(__name__) or {}
+    values = {}
+    for key, value in conf.items():
+        name = attribute_name(key)
+        if name in Config._field_defaults:
+            values[name] = typed(value, Config._field_defaults[name])
+    return Config(**values)
+
+
+_snapshot = load()
+
+
+def snapshot():
+    """the current settings. Keep the result for the duration of one action so that all
+    settings come from the same version of the config."""
+    return _snapshot
+
+
+# functions without arguments that are called after the config was changed, e.g.
+# to throw away cached objects that were built with the old settings
+config_changed_callbacks = []
+
+
+def on_config_changed(*args):
+    global _snapshot
+    # replaced in one assignment so that other threads see either the old or the new config
+    _snapshot = load()
+    for func in config_changed_callbacks:
+        func()
+mw.addonManager.setConfigUpdatedAction(__name__, on_config_changed)
 
 
 # Syntax Highlighting (Enhanced Fork) has the id 1972239816 which 
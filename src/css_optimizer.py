@@ -0,0 +1,183 @@
+"""
+Makes the css file for the media folder smaller.
+
+The file contains the css of each style that is used in the collection (plus an unprefixed
+copy of the default style). Most of it is a long list of rules like
+    .shf__default__highlight .kc { color: #008000; font-weight: bold } /* Keyword.Constant */
+where many rules have the same declarations. This file
+- removes comments and unnecessary whitespace,
+- removes declarations that are overridden later by a rule with the same selector,
+- merges rules with the same declarations into one rule with a selector list.
+
+Changing the order of css rules can change the result. So rules are only merged if no rule
+in between sets one of their properties. This also applies to the rules for pygments token
+classes: a span can have more than one class (e.g. "k k-Foo" for subtypes that aren't in
+pygments.token.STANDARD_TYPES).
+"""
+
+import re
+
+
+comment = re.compile(r"/\*.*?\*/", re.S)
+whitespace = re.compile(r"\s+")
+around_combinators = re.compile(r"\s*([>+~,])\s*")
+
+
+class Rule:
+    def __init__(self, selectors, declarations):
+        self.selectors = selectors        # list of normalized selectors
+        self.declarations = declarations  # list of (property, value), value incl. !important
+
+    def props(self):
+        return {p for p, _ in self.declarations}
+
+
+class AtRule:
+    """@media etc. are copied without changes and are never moved across"""
+    def __init__(self, text):
+        self.text = text
+
+
+def normalize_selector(selector):
+    selector = whitespace.sub(" ", selector.strip())
+    return around_combinators.sub(r"\1", selector)
+
+
+def split_outside(text, sep):
+    """split text at sep except inside quotes and parentheses, e.g. in url(data:...;...)"""
+    parts = []
+    start = 0
+    depth = 0
+    quote = None
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if quote:
+            if c == "\\":
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c in "\"'":
+            quote = c
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth = max(depth - 1, 0)
+        elif c == sep and not depth:
+            parts.append(text[start:i])
+            start = i + 1
+        i += 1
+    parts.append(text[start:])
+    return parts
+
+
+def parse_declarations(block):
+    declarations = []
+    for part in split_outside(block, ";"):
+        prop, sep, value = part.partition(":")
+        if not sep:
+            continue
+        value = whitespace.sub(" ", value.strip()).replace(" !important", "!important")
+        declarations.append((prop.strip().lower(), value))
+    return declarations
+
+
+def parse(css):
+    css = comment.sub("", css)
+    rules = []
+    pos = 0
+    length = len(css)
+    while pos < length:
+        brace = css.find("{", pos)
+        if brace == -1:
+            break
+        prelude = css[pos:brace].strip()
+        # find the matching closing brace, at-rules like @media contain nested blocks
+        depth = 1
+        end = brace + 1
+        while end < length and depth:
+            if css[end] == "{":
+                depth += 1
+            elif css[end] == "}":
+                depth -= 1
+            end += 1
+        body = css[brace + 1:end - 1]
+        if prelude.startswith("@"):
+            rules.append(AtRule(whitespace.sub(" ", css[pos:end].strip())))
+        else:
+            selectors = [normalize_selector(s) for s in split_outside(prelude, ",") if s.strip()]
+            rules.append(Rule(selectors, parse_declarations(body)))
+        pos = end
+    return rules
+
+
+def is_important(value):
+    return value.endswith("!important")
+
+
+def drop_overridden(rules):
+    """remove declarations that a later rule with the same selector overrides"""
+    later = {}  # selector -> {property: important}
+    for rule in reversed(rules):
+        if isinstance(rule, AtRule) or len(rule.selectors) != 1:
+            continue
+        seen = later.setdefault(rule.selectors[0], {})
+        kept = []
+        for prop, value in reversed(rule.declarations):
+            important = is_important(value)
+            if prop in seen and (seen[prop] or not important):
+                continue
+            seen[prop] = seen.get(prop, False) or important
+            kept.append((prop, value))
+        rule.declarations = kept[::-1]
+    return [r for r in rules if isinstance(r, AtRule) or r.declarations]
+
+
+def conflicts(props, other_props):
+    # "background" also sets "background-color" etc.
+    for p in props:
+        for o in other_props:
+            if p == o or p.startswith(o + "-") or o.startswith(p + "-"):
+                return True
+    return False
+
+
+def merge_identical(rules):
+    """merge rules with the same declarations into the first of them if that's safe"""
+    merged = []
+    first_with = {}  # declarations -> index in merged
+    for rule in rules:
+        if isinstance(rule, AtRule):
+            merged.append(rule)
+            first_with = {}
+            continue
+        key = tuple(rule.declarations)
+        target = first_with.get(key)
+        if target is not None:
+            props = rule.props()
+            for between in merged[target + 1:]:
+                if conflicts(props, between.props()):
+                    target = None
+                    break
+        if target is None:
+            first_with[key] = len(merged)
+            merged.append(Rule(list(rule.selectors), rule.declarations))
+        else:
+            selectors = merged[target].selectors
+            selectors.extend(s for s in rule.selectors if s not in selectors)
+    return merged
+
+
+def serialize(rules):
+    out = []
+    for rule in rules:
+        if isinstance(rule, AtRule):
+            out.append(rule.text)
+        else:
+            decls = ";".join(f"{p}:{v}" for p, v in rule.declarations)
+            out.append(",".join(rule.selectors) + "{" + decls + "}")
+    return "\n".join(out) + "\n"
+
+
+def optimize_css(css):
+    return serialize(merge_identical(drop_overridden(parse(css))))
@@ -0,0 +1,112 @@
+"""
+Default language for the deck, note type and field that the editor shows.
+
+The setting "deckdefaultlang" maps deck names to languages. A deck without its own entry
+gets the language of its closest parent with one, e.g. "CS::Python::Async" gets the
+language of "CS::Python" or "CS". Resolving this on every opening of the helper menu
+would mean walking the deck names, so a map from deck id to language (or None) is built
+for all decks on first use and thrown away when decks are added, renamed or deleted or
+when the config changes. Looking up a deck is then one dict access.
+
+The settings are stored by deck name, so a renamed deck would lose its language. When a
+deck is renamed in Anki the entries for the deck and its subdecks are renamed in the
+config, too.
+
+"notetypedefaultlang" ({note type: language}) and "fielddefaultlang" ({note type:
+{field: language}}) take precedence over the deck. They are only set in the config
+json.
+"""
+
+from anki.decks import DeckManager
+from anki.hooks import addHook, wrap
+from aqt import mw
+
+from .config import config_changed_callbacks, on_config_changed, snapshot
+
+
+_deck_langs = None  # deck id: language or None
+
+
+def invalidate():
+    global _deck_langs
+    _deck_langs = None
+config_changed_callbacks.append(invalidate)
+
+
+def language_for_deck_name(name, deckdefaultlang):
+    parts = name.split("::")
+    for i in range(len(parts), 0, -1):
+        lang = deckdefaultlang.get("::".join(parts[:i]))
+        if lang:
+            return lang
+    return None
+
+
+def _build():
+    deckdefaultlang = snapshot().deckdefaultlang
+    return {int(d["id"]): language_for_deck_name(d["name"], deckdefaultlang)
+            for d in mw.col.decks.all()}
+
+
+def deck_language(did):
+    global _deck_langs
+    if mw.col is None or did is None:
+        return None
+    langs = _deck_langs
+    if langs is None:
+        langs = _deck_langs = _build()
+    return langs.get(did)
+
+
+def note_type_language(note, field_index):
+    """language from notetypedefaultlang or fielddefaultlang for the field with this index"""
+    conf = snapshot()
+    if note is None or not (conf.notetypedefaultlang or conf.fielddefaultlang):
+        return None
+    model = note.model()
+    fields = conf.fielddefaultlang.get(model["name"])
+    if isinstance(fields, dict) and field_index is not None and field_index < len(model["flds"]):
+        lang = fields.get(model["flds"][field_index]["name"])
+        if isinstance(lang, str) and lang:
+            return lang
+    lang = conf.notetypedefaultlang.get(model["name"])
+    return lang if isinstance(lang, str) and lang else None
+
+
+def renamed_entries(deckdefaultlang, old, new):
+    """deckdefaultlang with the deck old and its subdecks renamed to new"""
+    result = {}
+    for name, lang in deckdefaultlang.items():
+        if name == old or name.startswith(old + "::"):
+            name = new + name[len(old):]
+        result[name] = lang
+    return result
+
+
+def on_rename(self, deck, newName, *args, _old, **kwargs):
+    old = deck["name"]
+    result = _old(self, deck, newName, *args, **kwargs)
+    invalidate()
+    conf = mw.addonManager.getConfig(__name__)
+    if conf and conf.get("deckdefaultlang"):
+        # rename stores the normalized name in the deck
+        renamed = renamed_entries(conf["deckdefaultlang"], old, deck["name"])
+        if renamed != conf["deckdefaultlang"]:
+            conf["deckdefaultlang"] = renamed
+            mw.addonManager.writeConfig(__name__, conf)
+            on_config_changed()
+    return result
+
+
+def on_id(self, name, *args, _old, **kwargs):
+    # id() also returns the ids of existing decks, only a new deck changes the map
+    did = _old(self, name, *args, **kwargs)
+    if _deck_langs is not None and did and did not in _deck_langs:
+        invalidate()
+    return did
+
+
+DeckManager.rename = wrap(DeckManager.rename, on_rename, "around")
+DeckManager.id = wrap(DeckManager.id, on_id, "around")
+DeckManager.rem = wrap(DeckManager.rem, lambda *args, **kwargs: invalidate())
+addHook("unloadProfile", invalidate)
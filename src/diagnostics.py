@@ -0,0 +1,75 @@
+"""
+Dialog that shows the percentiles of the timings in the ring buffer of timings.py. It's
+opened from the settings. The buffer can be exported as JSON, e.g. to attach it to a bug
+report about slow highlighting.
+"""
+
+from aqt.qt import *
+from aqt.utils import (
+    restoreGeom,
+    saveGeom,
+    tooltip,
+)
+
+from . import timings
+
+
+COLUMNS = ["action", "stage", "n", "p50 ms", "p90 ms", "p99 ms", "max ms"]
+
+
+class DiagnosticsDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Syntax Highlighting: timings")
+        self.setupUI()
+        self.fill()
+        restoreGeom(self, "1972239816_diagnostics_dialog")
+
+    def setupUI(self):
+        vlay = QVBoxLayout()
+        self.label = QLabel()
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        buttonbox = QDialogButtonBox(QDialogButtonBox.Close)
+        export = buttonbox.addButton("Export JSON ...", QDialogButtonBox.ActionRole)
+        export.clicked.connect(self.onExport)
+        clear = buttonbox.addButton("Clear", QDialogButtonBox.ResetRole)
+        clear.clicked.connect(self.onClear)
+        buttonbox.rejected.connect(self.reject)
+        vlay.addWidget(self.label)
+        vlay.addWidget(self.table)
+        vlay.addWidget(buttonbox)
+        self.setLayout(vlay)
+
+    def fill(self):
+        self.label.setText(f"The last {len(timings.records)} actions in this session "
+                           f"(at most {timings.BUFFER_SIZE}). Stages that overlap "
+                           "(e.g. saveNow) or don't happen every time don't add up to the total.")
+        rows = timings.summary()
+        self.table.setRowCount(len(rows))
+        for row, ((action, stage), stats) in enumerate(rows.items()):
+            values = [action, stage, stats["n"], stats["p50"], stats["p90"], stats["p99"], stats["max"]]
+            for col, value in enumerate(values):
+                text = f"{value:.1f}" if isinstance(value, float) else str(value)
+                item = QTableWidgetItem(text)
+                if col >= 2:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, col, item)
+        self.table.resizeColumnsToContents()
+
+    def onExport(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export timings", "syntax_highlighting_timings.json", "JSON (*.json)")
+        if path:
+            timings.export(path)
+            tooltip(f"Exported {len(timings.records)} timings.", parent=self)
+
+    def onClear(self):
+        timings.clear()
+        self.fill()
+
+    def reject(self):
+        saveGeom(self, "1972239816_diagnostics_dialog")
+        super().reject()
@@ -0,0 +1,104 @@
+"""
+Load the css for highlighted code into the editor.
+
+The editor used to get the whole css file from the media folder which contains the css
+of every style that is used anywhere in the collection. Now the editor only gets a small
+script. When a note is loaded the styles used in its fields are collected and only the
+css for styles that the editor webview doesn't have yet is sent. The functions for this
+(shfMissingStyles and shfAddStyles) are in the script that syntax_highlighting.py adds to
+the editor, so that this file is only imported when the first note is loaded.
+
+The css file from the media folder is parsed once (and again when it changes) and split
+into one fragment per style so that custom changes of the file also apply in the editor.
+Each fragment has a version (a hash of its css) that is stored on its <style> element in
+the editor, so a fragment that changed (e.g. after a new style was chosen in the settings)
+replaces the old one the next time a note with this style is loaded.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+from aqt import mw
+
+from .styles_in_use import styles_in
+
+
+COMMON = "_common"    # rules that don't belong to a style
+DEFAULT = "highlight"  # rules for the unprefixed class "highlight"
+
+style_in_selector = re.compile(r"\.shf__([\w-]+?)__highlight")
+default_class_in_selector = re.compile(r"\.highlight(?![\w-])")
+default_class_in_html = re.compile(r"""class=["']?(?:[^"'>]*\s)?highlight(?![\w-])""")
+
+_fragments = {}  # name: (version, css)
+_file_state = None
+
+
+def css_file():
+    return os.path.join(mw.pm.profileFolder(), "collection.media", "_styles_for_syntax_highlighting.css")
+
+
+def split_by_style(css):
+    # only imported when the first note with highlighted code is loaded
+    from .css_optimizer import Rule, parse, serialize
+    rules_by_name = {}
+    for rule in parse(css):
+        if not isinstance(rule, Rule):
+            rules_by_name.setdefault(COMMON, []).append(rule)
+            continue
+        by_name = {}
+        for sel in rule.selectors:
+            m = style_in_selector.search(sel)
+            if m:
+                name = m.group(1)
+            elif default_class_in_selector.search(sel):
+                name = DEFAULT
+            else:
+                name = COMMON
+            by_name.setdefault(name, []).append(sel)
+        for name, selectors in by_name.items():
+            rules_by_name.setdefault(name, []).append(Rule(selectors, rule.declarations))
+    return {name: serialize(rules) for name, rules in rules_by_name.items()}
+
+
+def fragments():
+    global _fragments, _file_state
+    path = css_file()
+    try:
+        st = os.stat(path)
+        state = (path, st.st_mtime, st.st_size)
+    except OSError:
+        return {}
+    if state != _file_state:
+        with open(path, encoding="utf-8") as f:
+            _fragments = {name: (hashlib.sha1(css.encode("utf-8")).hexdigest()[:8], css)
+                          for name, css in split_by_style(f.read()).items()}
+        _file_state = state
+    return _fragments
+
+
+def names_in_html(html):
+    names = styles_in(html)
+    if default_class_in_html.search(html):
+        names.append(DEFAULT)
+    return names
+
+
+def load_styles(editor, names):
+    available = fragments()
+    wanted = [n for n in [COMMON] + list(names) if n in available]
+    if not wanted:
+        return
+
+    def send_missing(missing):
+        if missing:
+            editor.web.eval("shfAddStyles(%s);" % json.dumps({n: available[n] for n in missing}))
+    versions = {n: available[n][0] for n in wanted}
+    editor.web.evalWithCallback("shfMissingStyles(%s);" % json.dumps(versions), send_missing)
+
+
+def on_load_note(editor):
+    if editor.note:
+        load_styles(editor, names_in_html("".join(editor.note.fields)))
@@ -17,13 +17,13 @@ along with this file.  If not, see <http://www.gnu.org/licenses/>.
 
 
 extracted from https://github.com/renerocksai/sublimeless_zk/tree/6738375c0e371f0c2fde0aa9e539242cfd2b4777/src
-mainly from fuzzypanel.py (both Classes) and utils.py (the helper functions from the 
-bottom of this file)
+mainly from fuzzypanel.py (both Classes) and utils.py (the helper functions that are now
+in fuzzy_search.py)
 
 
 This is a pyqt dialog that 
 - takes a list or dict
-- shows the listitems or dictkeys in a QListWidget that you can filter
+- shows the listitems or dictkeys in a QListView that you can filter
 - returns select listitem or dictkey/dictvalue
 
 use the class FilterDialog like this:
@@ -37,13 +37,20 @@ syntax for the default search method:
 - ! to exclude a string, 
 - " to search for space (e.g. "the wind"), 
 - _ to indicate that the line must start with this string (e.g. _wind won't match some wind)
+- strings without ! and _ match fuzzy: their characters must appear in this order but
+  not necessarily next to each other (e.g. js matches JavaScript). The best matches are
+  shown first.
 
 """
 
+import itertools
+
 from aqt import mw
 from aqt.qt import *
 from aqt.utils import tooltip, restoreGeom, saveGeom
 
+from .fuzzy_search import index_for, process_search_string
+
 
 class PanelInputLine(QLineEdit):
     down_pressed = pyqtSignal()
@@ -68,8 +75,46 @@ class PanelInputLine(QLineEdit):
             self.up_pressed.emit()
 
 
+class FilterModel(QAbstractListModel):
+    fetch_size = 100
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.items = []
+        self.more = None  # iterator over the items that aren't loaded yet
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.items)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return self.items[index.row()]
+        return None
+
+    def set_items(self, items, more=None):
+        self.beginResetModel()
+        self.items = items
+        self.more = more
+        self.endResetModel()
+        if self.canFetchMore():
+            self.fetchMore()
+
+    # the view asks for more items when it's scrolled to the end
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.more is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        new = list(itertools.islice(self.more, self.fetch_size))
+        if len(new) < self.fetch_size:
+            self.more = None
+        if new:
+            self.beginInsertRows(QModelIndex(), len(self.items), len(self.items) + len(new) - 1)
+            self.items.extend(new)
+            self.endInsertRows()
+
+
 class FilterDialog(QDialog):
-    def __init__(self, parent=None, values=None, windowtitle="", max_items=2000, prefill=""):
+    def __init__(self, parent=None, values=None, windowtitle="", max_items=None, prefill=""):
         super().__init__(parent)
         self.parent = parent
         self.max_items = max_items
@@ -83,6 +128,9 @@ class FilterDialog(QDialog):
             self.dict = False
             self.keys = sorted(values)
         self.fuzzy_items = self.keys[:max_items]
+        # shared with the next dialog for the same keys so that filtering long lists
+        # (e.g. all decks) doesn't lag, see fuzzy_search.py
+        self.index = index_for(tuple(self.keys))
         self.initUI()
         if prefill:
             self.input_line.setText(prefill)
@@ -90,9 +138,11 @@ class FilterDialog(QDialog):
     def initUI(self):
         self.vlay = QVBoxLayout()
         self.input_line = PanelInputLine()
-        self.list_box = QListWidget()
-        for i in range(self.max_items):
-            self.list_box.insertItem(i, '')
+        # only the visible rows are created by the view
+        self.model = FilterModel(self)
+        self.list_box = QListView()
+        self.list_box.setUniformItemSizes(True)
+        self.list_box.setModel(self.model)
         self.vlay.addWidget(self.input_line)
         self.vlay.addWidget(self.list_box)
 
@@ -125,11 +175,15 @@ class FilterDialog(QDialog):
         self.list_box.setAlternatingRowColors(True)
 
         # connections
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(40 if len(self.keys) > 1000 else 0)
+        self.filter_timer.timeout.connect(self.apply_filter)
         self.input_line.textChanged.connect(self.text_changed)
         self.input_line.returnPressed.connect(self.return_pressed)
         self.input_line.down_pressed.connect(self.down_pressed)
         self.input_line.up_pressed.connect(self.up_pressed)
-        self.list_box.itemDoubleClicked.connect(self.item_doubleclicked)
+        self.list_box.doubleClicked.connect(self.item_doubleclicked)
         self.list_box.installEventFilter(self)
         self.input_line.setFocus()
 
@@ -138,9 +192,11 @@ class FilterDialog(QDialog):
         QDialog.reject(self)
 
     def accept(self):
-        row = self.list_box.currentRow()
+        if self.filter_timer.isActive():
+            self.filter_timer.stop()
+            self.apply_filter()
         if len(self.fuzzy_items) > 0:
-            row = self.list_box.currentRow()
+            row = max(0, self.current_row())
             self.selkey = self.fuzzy_items[row]
             if self.dict:
                 self.selvalue = self.dict[self.selkey]
@@ -150,19 +206,26 @@ class FilterDialog(QDialog):
             tooltip('nothing selected. Aborting ...')
             return
 
-    def update_listbox(self):
-        for i in range(self.max_items):
-            item = self.list_box.item(i)
-            if i < len(self.fuzzy_items):
-                item.setHidden(False)
-                item.setText(self.fuzzy_items[i])
-            else:
-                item.setHidden(True)
-        self.list_box.setCurrentRow(0)
+    def current_row(self):
+        return self.list_box.currentIndex().row()
+
+    def set_current_row(self, row):
+        self.list_box.setCurrentIndex(self.model.index(row))
+
+    def update_listbox(self, more=None):
+        # fuzzy_items is the list of the model so it also contains the items loaded later
+        self.model.set_items(self.fuzzy_items, more)
+        self.set_current_row(0)
 
     def text_changed(self):
+        # wait for a short pause while typing so that no filter pass is wasted on
+        # a query that is outdated before its result is shown
+        self.filter_timer.start()
+
+    def apply_filter(self):
         search_string = self.input_line.text()
-        FILTER_WITH = "slzk_mod"   # "slzk", "fuzzyfinder"
+        FILTER_WITH = "ranked"   # "slzk_mod", "slzk", "fuzzyfinder"
+        more = None
         if FILTER_WITH == "fuzzyfinder":  # https://pypi.org/project/fuzzyfinder/
             if search_string:
                 self.fuzzy_items = list(fuzzyfinder(search_string, self.keys))[:self.max_items]   
@@ -171,25 +234,33 @@ class FilterDialog(QDialog):
         else:
             if not search_string:
                 search_string = ""
-            if FILTER_WITH == "slzk_mod":
-                self.fuzzy_items = process_search_string_withStart(search_string, self.keys, self.max_items)
+            if FILTER_WITH == "ranked":
+                top, rest = self.index.rank(search_string)
+                self.fuzzy_items = [self.keys[idx] for idx in top][:self.max_items]
+                rest = (self.keys[idx] for idx in rest)
+                if self.max_items is None:
+                    more = rest
+                elif len(self.fuzzy_items) < self.max_items:
+                    more = itertools.islice(rest, self.max_items - len(self.fuzzy_items))
+            elif FILTER_WITH == "slzk_mod":
+                self.fuzzy_items = self.index.filter(search_string)[:self.max_items]
             elif FILTER_WITH == "slzk":
                 self.fuzzy_items = process_search_string(search_string, self.keys, self.max_items)
-        self.update_listbox()
+        self.update_listbox(more)
 
     def up_pressed(self):
-        row = self.list_box.currentRow()
+        row = self.current_row()
         if row == 0:
-            self.list_box.setCurrentRow(len(self.fuzzy_items) - 1) 
+            self.set_current_row(len(self.fuzzy_items) - 1)
         else:
-            self.list_box.setCurrentRow(row - 1)
+            self.set_current_row(row - 1)
 
     def down_pressed(self):
-        row = self.list_box.currentRow()
+        row = self.current_row()
         if row == len(self.fuzzy_items) - 1:
-            self.list_box.setCurrentRow(0)
+            self.set_current_row(0)
         else:
-            self.list_box.setCurrentRow(row + 1)
+            self.set_current_row(row + 1)
 
     def return_pressed(self):
         self.accept()
@@ -203,147 +274,3 @@ class FilterDialog(QDialog):
             return True
         else:
             return QWidget.eventFilter(self, watched, event)
-
-
-def process_search_string_withStart(search_terms, keys, max):
-    """inspired by find_in_files from sublimelesszk"""
-    search_terms = split_search_terms_withStart(search_terms)
-    results = []
-    for lent in keys:
-        for presence, atstart, term in search_terms:
-            if term.islower():
-                i = lent.lower()
-            else:
-                i = lent
-
-            # if presence and term not in i:
-                # break
-            # elif not presence and term in i:
-                # break
-                
-            if presence:
-                if term not in i:
-                    break
-                elif atstart and not i.startswith(term):
-                    break
-            else:   # not in
-                if term in i:
-                    break
-                elif atstart and i.startswith(term):
-                    break
-        else:
-            results.append(lent)
-    return results
-    
-
-def split_search_terms_withStart(search_string):
-    """
-    Split a search-spec (for find in files) into tuples:
-    (posneg, string)
-    posneg: True: must be contained, False must not be contained
-    string: what must (not) be contained
-    """
-    in_quotes = False
-    in_neg = False
-
-    at_start = False
-
-    pos = 0
-    str_len = len(search_string)
-    results = []
-    current_snippet = ''
-
-    literal_quote_sign = '"'
-    exclude_sign = '!'
-    startswith_sign = "_" 
-
-    while pos < str_len:
-        if search_string[pos:].startswith(literal_quote_sign):
-            in_quotes = not in_quotes
-            if not in_quotes:
-                # finish this snippet
-                if current_snippet:
-                    results.append((in_neg, at_start, current_snippet))
-                in_neg = False
-                current_snippet = ''
-            pos += 1
-        elif search_string[pos:].startswith(exclude_sign) and not in_quotes and not current_snippet:
-            in_neg = True
-            pos += 1
-        elif search_string[pos:].startswith(startswith_sign) and not in_quotes and not current_snippet:
-            at_start = True
-            pos += 1
-        elif search_string[pos] in (' ', '\t') and not in_quotes:
-            # push current snippet
-            if current_snippet:
-                results.append((in_neg, at_start, current_snippet))
-            in_neg = False
-            at_start = False
-            current_snippet = ''
-            pos += 1
-        else:
-            current_snippet += search_string[pos]
-            pos += 1
-    if current_snippet:
-        results.append((in_neg, at_start, current_snippet))
-    return [(not in_neg, at_start, s) for in_neg, at_start, s in results]
-
-
-def process_search_string(search_terms, keys, max):
-    """inspired by find_in_files from sublimelesszk"""
-    search_terms = split_search_terms(search_terms)
-    results = []
-    for lent in keys:
-        for presence, term in search_terms:
-            if term.islower():
-                i = lent.lower()
-            else:
-                i = lent
-            if presence and term not in i:
-                break
-            elif not presence and term in i:
-                break
-        else:
-            results.append(lent)
-    return results
-
-
-def split_search_terms(search_string):
-    """
-    Split a search-spec (for find in files) into tuples:
-    (posneg, string)
-    posneg: True: must be contained, False must not be contained
-    string: what must (not) be contained
-    """
-    in_quotes = False
-    in_neg = False
-    pos = 0
-    str_len = len(search_string)
-    results = []
-    current_snippet = ''
-    while pos < str_len:
-        if search_string[pos:].startswith('"'):
-            in_quotes = not in_quotes
-            if not in_quotes:
-                # finish this snippet
-                if current_snippet:
-                    results.append((in_neg, current_snippet))
-                in_neg = False
-                current_snippet = ''
-            pos += 1
-        elif search_string[pos:].startswith('!') and not in_quotes and not current_snippet:
-            in_neg = True
-            pos += 1
-        elif search_string[pos] in (' ', '\t') and not in_quotes:
-            # push current snippet
-            if current_snippet:
-                results.append((in_neg, current_snippet))
-            in_neg = False
-            current_snippet = ''
-            pos += 1
-        else:
-            current_snippet += search_string[pos]
-            pos += 1
-    if current_snippet:
-        results.append((in_neg, current_snippet))
-    return [(not in_neg, s) for in_neg, s in results]
@@ -0,0 +1,567 @@
+"""
+Copyright (c): 2018  Rene Schallner
+               2019- ijgnd
+
+This file (fuzzy_search.py) is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This file is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this file.  If not, see <http://www.gnu.org/licenses/>.
+
+
+The search functions for the FilterDialog from fuzzy_panel.py. They were extracted from
+https://github.com/renerocksai/sublimeless_zk/tree/6738375c0e371f0c2fde0aa9e539242cfd2b4777/src
+(utils.py).
+
+The FilterDialog is also used for long lists (e.g. all decks of a large collection). So
+each query is answered by intersecting the sets of keys that contain the trigrams (or
+characters for short terms) of the search terms. Only the remaining candidates are
+checked with the search syntax that's explained in fuzzy_panel.py. Building all sets
+when the dialog opens took 590 ms for 20k keys, so each set is built when a query
+needs it and then kept, and the SearchIndex of a list of keys is reused by the next
+dialog with the same keys, see index_for.
+
+SearchIndex.rank is the default method of the FilterDialog: it matches the terms as
+subsequences (like fzf, so "js" matches "JavaScript") and sorts the best matches to the
+top, see fuzzy_score.
+"""
+
+import bisect
+import functools
+import heapq
+import itertools
+import re
+
+
+# weights for fuzzy_score, similar to the ones of fzf
+SCORE_MATCH = 16
+PENALTY_GAP_START = 3
+PENALTY_GAP_EXTENSION = 1
+BONUS_BOUNDARY = 8      # match at the start of a word
+BONUS_CAMEL = 8         # match at a lower->upper case change or at the start of a number
+BONUS_WORD_START = max(BONUS_BOUNDARY, BONUS_CAMEL)
+BONUS_CONSECUTIVE = 4   # or the bonus of the first character of the consecutive chunk
+BONUS_INITIALS = 8      # all characters of the term match at word starts ("js" -> "JavaScript")
+BONUS_FIRST_CHAR_MULTIPLIER = 2
+BONUS_PREFIX = 8        # the key starts with the first character of the term
+BONUS_CASE = 2          # an upper case character of the term matches the same case
+PENALTY_TYPO = 20       # for terms that only match with two swapped characters
+
+RANKED = 50             # only this many matches are sorted by score, the rest stays in order
+MAX_GROUPED_TERMS = 3   # see SearchIndex._groups
+
+# the characters for which char_bonus returns a bonus
+word_start = re.compile(r"(?<![^\W_]).|(?<=[a-z])[A-Z]|(?<=[^\W\d_])\d", re.S)
+
+
+@functools.lru_cache(maxsize=4)
+def index_for(keys):
+    """the SearchIndex for the tuple keys, with the sets that earlier queries built"""
+    return SearchIndex(keys)
+
+
+class SearchIndex:
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.lower = [k.lower() for k in self.keys]
+        self.all = range(len(self.keys))
+        # the sets are built on first use, see _postings
+        self.chars = {}     # character -> set of indexes of the keys that contain it
+        self.trigrams = {}  # trigram -> set of indexes
+        self.first = {}     # first character -> set of indexes
+        self.last_ranked = None  # (search terms, (parts, candidates)) of the last call of rank
+        self.word_starts = {}  # character -> set of indexes of the keys with it at a word start
+        self._sorted_lower = None
+        self._initials = None  # the characters at word starts of each key, in lower case
+
+    @property
+    def sorted_lower(self):
+        if self._sorted_lower is None:
+            self._sorted_lower = sorted(zip(self.lower, self.all))
+        return self._sorted_lower
+
+    def _postings(self, kind, part):
+        """the set of indexes for part (a character or trigram) in the dict kind"""
+        cache = getattr(self, kind)
+        result = cache.get(part)
+        if result is None:
+            if kind == "first":
+                result = {idx for idx, key in enumerate(self.lower) if key.startswith(part)}
+            elif kind == "word_starts":
+                result = self._word_starts(part)
+            else:
+                result = {idx for idx, key in enumerate(self.lower) if part in key}
+            cache[part] = result
+        return result
+
+    def _word_starts(self, c):
+        # word_start is slow (100 ms for 20k keys) so it's only run once for all keys,
+        # when the first fuzzy term needs it
+        if self._initials is None:
+            self._initials = ["".join(word_start.findall(k)).lower() for k in self.keys]
+        return {idx for idx, initials in enumerate(self._initials) if c in initials}
+
+    def _candidate_parts(self, term, atstart):
+        """(kind, part) for the sets of _postings that contain all keys with term"""
+        term = term.lower()
+        if len(term) >= 3:
+            parts = [("trigrams", term[i:i + 3]) for i in range(len(term) - 2)]
+        else:
+            parts = [("chars", c) for c in term]
+        if atstart:
+            parts.append(("first", term[0]))
+        return parts
+
+    def _candidates(self, term, atstart):
+        return [self._postings(kind, part) for kind, part in self._candidate_parts(term, atstart)]
+
+    def search(self, search_string):
+        """returns the indexes of the matching keys, in the order of the keys"""
+        search_terms = split_search_terms_withStart(search_string)
+        if not search_terms:
+            return list(self.all)
+        sets = []
+        for presence, atstart, term in search_terms:
+            if presence:
+                sets.extend(self._candidates(term, atstart))
+        sets.sort(key=len)
+        if sets:
+            candidates = set(sets[0])
+            for s in sets[1:]:
+                candidates &= s
+                if not candidates:
+                    return []
+            candidates = sorted(candidates)
+        else:
+            candidates = self.all
+        return [idx for idx in candidates if self.matches(idx, search_terms)]
+
+    def matches(self, idx, search_terms):
+        for presence, atstart, term in search_terms:
+            i = self.lower[idx] if term.islower() else self.keys[idx]
+            if presence:
+                if term not in i:
+                    return False
+                elif atstart and not i.startswith(term):
+                    return False
+            else:   # not in
+                if term in i:
+                    return False
+                elif atstart and i.startswith(term):
+                    return False
+        return True
+
+    def filter(self, search_string):
+        return [self.keys[idx] for idx in self.search(search_string)]
+
+    def rank(self, search_string, limit=RANKED):
+        """
+        returns the indexes of the `limit` best matches sorted by their score and an
+        iterator over the indexes of the other matches in the order of the keys.
+        Terms with ! or _ are matched like in search, all other terms fuzzy.
+        """
+        search_terms = split_search_terms_withStart(search_string)
+        if not search_terms:
+            self.last_ranked = None
+            return list(self.all[:limit]), iter(self.all[limit:])
+        previous = None
+        if self.last_ranked is not None and is_refinement(self.last_ranked[0], search_terms):
+            # while typing most queries just extend the previous one. A key that matches
+            # a term as a subsequence also matches every substring of the term, so the
+            # previous candidates only have to be intersected with the new sets.
+            previous = self.last_ranked[1]
+        exact = [t for t in search_terms if not t[0] or t[1]]
+        fuzzy = [[t[2]] for t in search_terms if t[0] and not t[1]]
+        top, rest, found = self._rank(exact, fuzzy, limit, previous)
+        if not top and any(len(v[0]) > 2 for v in fuzzy):
+            # the typo variants have the same characters, so the candidates stay the same
+            fuzzy = [typo_variants(v[0]) if len(v[0]) > 2 else v for v in fuzzy]
+            top, rest, found = self._rank(exact, fuzzy, limit, found)
+        self.last_ranked = (search_terms, found)
+        return top, rest
+
+    def _rank(self, exact, fuzzy, limit, previous=None):
+        """previous is (parts, candidates) of an earlier query that the keys have to match"""
+        parts = []
+        for presence, atstart, term in exact:
+            if presence:
+                parts.extend(self._candidate_parts(term, atstart))
+        for variants in fuzzy:
+            # every character of a fuzzy term (or of its typo variants) must be in the key
+            parts.extend(("chars", c) for c in set(variants[0].lower()))
+        if previous is not None:
+            # the previous candidates are already in the sets of the previous parts.
+            # intersection goes through the smaller set, i.e. the previous candidates
+            old_parts, old_candidates = previous
+            candidates = old_candidates.intersection(
+                *(self._postings(*part) for part in parts if part not in old_parts))
+        elif parts:
+            sets = sorted((self._postings(*part) for part in parts), key=len)
+            candidates = set(sets[0]).intersection(*sets[1:])
+        else:
+            candidates = set(self.all)
+        # the regexes reject most keys that don't match much faster than fuzzy_score
+        prefilters = [re.compile("|".join(subsequence_pattern(v) for v in variants))
+                      for variants in fuzzy]
+
+        def is_match(idx):
+            lower = self.lower[idx]
+            return all(p.search(lower) for p in prefilters) and self.matches(idx, exact)
+
+        # Only the keys that can still get into the top are scored: the groups are
+        # checked from the highest to the lowest possible score and the search stops
+        # when the worst entry of the heap is at least as good as the best score that's
+        # still possible. Keys with the same score are ranked in the order they were
+        # checked.
+        heap = []
+        checked = 0
+        for bound, group in self._groups(candidates, fuzzy):
+            if len(heap) == limit and heap[0][0] >= bound:
+                break
+            for idx in group:
+                if len(heap) == limit and heap[0][0] >= bound:
+                    break
+                if not is_match(idx):
+                    continue
+                entry = (self._score(idx, fuzzy), -checked, idx)
+                checked += 1
+                if len(heap) < limit:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+        top = [idx for _, _, idx in sorted(heap, reverse=True)]
+        in_top = set(top)
+        if len(candidates) > len(self.keys) // 4:
+            in_order = (idx for idx in self.all if idx in candidates)
+        else:
+            in_order = sorted(candidates)
+        rest = (idx for idx in in_order if idx not in in_top and is_match(idx))
+        return top, rest, (frozenset(parts), candidates)
+
+    def _groups(self, candidates, fuzzy):
+        """
+        yields groups of the candidates and the highest score that fuzzy_score can return
+        for the keys of each group, from the highest to the lowest score. The groups are
+        only built when they are needed. In each group the keys that probably contain the
+        terms without gaps come first.
+        """
+        if any(len(v) > 1 for v in fuzzy):
+            # typo variants can start with other characters
+            yield float("inf"), sorted(candidates)
+            return
+        # only the first terms are used for the groups, the others add their maximum
+        grouped = fuzzy[:MAX_GROUPED_TERMS]
+        bound = sum(max_score(v[0], prefix=False, initials=False) for v in grouped)
+        bound += sum(max_score(v[0]) for v in fuzzy[MAX_GROUPED_TERMS:])
+        levels = [self._levels(v[0].lower(), candidates) for v in grouped]
+        combinations = sorted(itertools.product(*levels),
+                              key=lambda c: sum(bonus for bonus, _ in c), reverse=True)
+        contiguous = None
+        for combination in combinations:
+            group = candidates
+            for _, level in combination:
+                if not group:
+                    break
+                group = group & level()
+            if not group:
+                continue
+            if contiguous is None:
+                contiguous = candidates.intersection(*(self._contiguous(v[0].lower()) for v in fuzzy))
+            yield (bound + sum(bonus for bonus, _ in combination),
+                   sorted(group & contiguous) + sorted(group - contiguous))
+
+    def _levels(self, lterm, candidates):
+        """
+        the bonuses for the first character and for initials that keys can get and
+        functions that return the candidates that can get them
+        """
+        starts = lazy(lambda: self._postings("word_starts", lterm[0]) & candidates)
+        prefix = lazy(lambda: self._postings("first", lterm[0]) & candidates)
+        if len(lterm) > 1:
+            sets = sorted((self._postings("word_starts", c) for c in set(lterm)), key=len)
+            initials = lazy(lambda: candidates.intersection(*sets))
+        else:
+            initials = set
+        first_bonus = BONUS_WORD_START * BONUS_FIRST_CHAR_MULTIPLIER
+        return [
+            (first_bonus + BONUS_PREFIX + BONUS_INITIALS, lazy(lambda: prefix() & initials())),
+            (first_bonus + BONUS_PREFIX, lazy(lambda: prefix() - initials())),
+            (first_bonus + BONUS_INITIALS, lazy(lambda: (starts() - prefix()) & initials())),
+            (first_bonus, lazy(lambda: starts() - prefix() - initials())),
+            (0, lazy(lambda: candidates - starts())),
+        ]
+
+    def _contiguous(self, lterm):
+        """keys that probably contain lterm (for short terms: that start with it)"""
+        if len(lterm) >= 3:
+            sets = sorted((self._postings("trigrams", lterm[i:i + 3]) for i in range(len(lterm) - 2)), key=len)
+            return sets[0].intersection(*sets[1:])
+        start = bisect.bisect_left(self.sorted_lower, (lterm,))
+        end = bisect.bisect_left(self.sorted_lower, (lterm + "\uffff",))
+        return {idx for _, idx in self.sorted_lower[start:end]}
+
+    def _score(self, idx, fuzzy):
+        key = self.keys[idx]
+        lower = self.lower[idx]
+        total = 0
+        for variants in fuzzy:
+            best = None
+            for i, variant in enumerate(variants):
+                score = fuzzy_score(variant, key, lower)
+                if score is not None:
+                    if i:  # a typo variant
+                        score -= PENALTY_TYPO
+                    if best is None or score > best:
+                        best = score
+            total += best
+        return total
+
+
+def lazy(func):
+    """returns a function that calls func only once and then returns its first result"""
+    result = []
+
+    def get():
+        if not result:
+            result.append(func())
+        return result[0]
+    return get
+
+
+def subsequence_pattern(term):
+    return ".*?".join(re.escape(c) for c in term.lower())
+
+
+def typo_variants(term):
+    """the term and the terms with two neighboring characters swapped"""
+    variants = [term]
+    for i in range(len(term) - 1):
+        if term[i] != term[i + 1]:
+            variants.append(term[:i] + term[i + 1] + term[i] + term[i + 2:])
+    return variants
+
+
+def char_bonus(key, pos):
+    if pos == 0:
+        return BONUS_BOUNDARY
+    prev = key[pos - 1]
+    char = key[pos]
+    if not prev.isalnum():
+        return BONUS_BOUNDARY
+    if (prev.islower() and char.isupper()) or (prev.isalpha() and char.isdigit()):
+        return BONUS_CAMEL
+    return 0
+
+
+def max_score(term, prefix=True, initials=True):
+    """upper bound for fuzzy_score(term, key) for any key"""
+    score = len(term) * SCORE_MATCH + (len(term) - 1) * max(BONUS_WORD_START, BONUS_CONSECUTIVE)
+    score += BONUS_CASE * sum(1 for c in term if c != c.lower())
+    if prefix:
+        score += BONUS_WORD_START * BONUS_FIRST_CHAR_MULTIPLIER + BONUS_PREFIX
+    if initials and len(term) > 1:
+        score += BONUS_INITIALS
+    return score
+
+
+def fuzzy_score(term, key, lower=None):
+    """
+    score for the term as a subsequence of key (case insensitive), None if it isn't one.
+    Like the v1 algorithm of fzf: find the first occurrence, shorten it from the end and
+    then score the matched positions. If that occurrence doesn't start at a word start
+    the occurrence that starts at the next word start with the first character of the
+    term is scored, too (e.g. "a" in "Pharmacology::Anatomy"). Otherwise these keys
+    would score below the bound of their group in SearchIndex._groups and all keys of
+    the group would have to be scored.
+    """
+    if lower is None:
+        lower = key.lower()
+    lterm = term.lower()
+    pos = -1
+    for c in lterm:
+        pos = lower.find(c, pos + 1)
+        if pos == -1:
+            return None
+    # going backwards from the end of the first occurrence gives the shortest one
+    start = pos
+    for c in reversed(lterm[:-1]):
+        start = lower.rfind(c, 0, start)
+    score = _alignment_score(term, lterm, key, lower, start)
+    if char_bonus(key, start):
+        return score
+    pos = lower.find(lterm[0], start + 1)
+    while pos != -1 and not char_bonus(key, pos):
+        pos = lower.find(lterm[0], pos + 1)
+    if pos != -1:
+        other = _alignment_score(term, lterm, key, lower, pos)
+        if other is not None and other > score:
+            score = other
+    return score
+
+
+def _alignment_score(term, lterm, key, lower, start):
+    """score for the first character of the term at start and the others as early as
+    possible after it, None if they aren't all there"""
+    score = 0
+    prev = -1
+    pos = start - 1
+    chunk_bonus = 0
+    initials = len(lterm) > 1
+    for i, c in enumerate(lterm):
+        pos = lower.find(c, pos + 1)
+        if pos == -1:
+            return None
+        bonus = char_bonus(key, pos)
+        initials = initials and bonus > 0
+        if i == 0 or pos != prev + 1:
+            chunk_bonus = bonus
+        if i == 0:
+            bonus *= BONUS_FIRST_CHAR_MULTIPLIER
+            if pos == 0:
+                bonus += BONUS_PREFIX
+        elif pos == prev + 1:
+            bonus = max(bonus, BONUS_CONSECUTIVE, chunk_bonus)
+        elif not bonus:
+            # skipping to the start of the next word isn't penalized so that initials
+            # like "js" for "JavaScript" score well
+            score -= PENALTY_GAP_START + PENALTY_GAP_EXTENSION * (pos - prev - 2)
+        if term[i] != c and key[pos] == term[i]:
+            bonus += BONUS_CASE
+        score += SCORE_MATCH + bonus
+        prev = pos
+    if initials:
+        score += BONUS_INITIALS
+    return score
+
+
+def implies(new, old):
+    """True if every key that matches the term new also matches the term old"""
+    n_presence, n_atstart, n_term = new
+    o_presence, o_atstart, o_term = old
+    if not (n_presence and o_presence):
+        return new == old
+    if o_atstart and not n_atstart:
+        return False
+    if o_term.islower():
+        if not n_term.islower():
+            n_term = n_term.lower()
+    elif n_term.islower():
+        # old term is case sensitive but the new one isn't
+        return False
+    return n_term.startswith(o_term) if o_atstart else o_term in n_term
+
+
+def is_refinement(old_terms, new_terms):
+    """True if the results for new_terms are a subset of the results for old_terms"""
+    return all(any(implies(n, o) for n in new_terms) for o in old_terms)
+
+
+def process_search_string_withStart(search_terms, keys, max):
+    """inspired by find_in_files from sublimelesszk"""
+    return SearchIndex(keys).filter(search_terms)[:max]
+
+
+def split_search_terms_withStart(search_string):
+    """
+    Split a search-spec (for find in files) into tuples:
+    (posneg, atstart, string)
+    posneg: True: must be contained, False must not be contained
+    atstart: True: the key must start with string
+    string: what must (not) be contained
+    """
+    in_quotes = False
+    in_neg = False
+    at_start = False
+    results = []
+    current_snippet = []
+
+    literal_quote_sign = '"'
+    exclude_sign = '!'
+    startswith_sign = "_"
+
+    for char in search_string:
+        if char == literal_quote_sign:
+            in_quotes = not in_quotes
+            if not in_quotes:
+                # finish this snippet
+                if current_snippet:
+                    results.append((in_neg, at_start, "".join(current_snippet)))
+                in_neg = False
+                current_snippet = []
+        elif char == exclude_sign and not in_quotes and not current_snippet:
+            in_neg = True
+        elif char == startswith_sign and not in_quotes and not current_snippet:
+            at_start = True
+        elif char in (' ', '\t') and not in_quotes:
+            # push current snippet
+            if current_snippet:
+                results.append((in_neg, at_start, "".join(current_snippet)))
+            in_neg = False
+            at_start = False
+            current_snippet = []
+        else:
+            current_snippet.append(char)
+    if current_snippet:
+        results.append((in_neg, at_start, "".join(current_snippet)))
+    return [(not in_neg, at_start, s) for in_neg, at_start, s in results]
+
+
+def process_search_string(search_terms, keys, max):
+    """inspired by find_in_files from sublimelesszk"""
+    search_terms = split_search_terms(search_terms)
+    results = []
+    for lent in keys:
+        for presence, term in search_terms:
+            if term.islower():
+                i = lent.lower()
+            else:
+                i = lent
+            if presence and term not in i:
+                break
+            elif not presence and term in i:
+                break
+        else:
+            results.append(lent)
+    return results
+
+
+def split_search_terms(search_string):
+    """
+    Split a search-spec (for find in files) into tuples:
+    (posneg, string)
+    posneg: True: must be contained, False must not be contained
+    string: what must (not) be contained
+    """
+    in_quotes = False
+    in_neg = False
+    results = []
+    current_snippet = []
+    for char in search_string:
+        if char == '"':
+            in_quotes = not in_quotes
+            if not in_quotes:
+                # finish this snippet
+                if current_snippet:
+                    results.append((in_neg, "".join(current_snippet)))
+                in_neg = False
+                current_snippet = []
+        elif char == '!' and not in_quotes and not current_snippet:
+            in_neg = True
+        elif char in (' ', '\t') and not in_quotes:
+            # push current snippet
+            if current_snippet:
+                results.append((in_neg, "".join(current_snippet)))
+            in_neg = False
+            current_snippet = []
+        else:
+            current_snippet.append(char)
+    if current_snippet:
+        results.append((in_neg, "".join(current_snippet)))
+    return [(not in_neg, s) for in_neg, s in results]
@@ -0,0 +1,185 @@
+"""
+Highlight long snippets in a background thread.
+
+pygments is pure python and needs a few seconds for some thousand lines (e.g. a long sql
+dump or minified javascript). hilcd used to do this on the main thread so that the whole
+editor froze. Now long snippets are highlighted in a thread while a progress dialog is
+shown that doesn't take the focus away from the editor. Esc in the editor or the cancel
+button of the dialog stops the thread soon (see highlighter.highlight).
+
+The result is only inserted if the editor still shows the same note and the same field
+is still focused. Everything except the highlighting itself (cache access, inserting into
+the editor) runs on the main thread.
+
+Huge snippets are passed to the editor in chunks while they are highlighted (see
+size_policy.py). The editor collects them and only inserts them at the end.
+"""
+
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from anki.utils import json
+from aqt.qt import *
+from aqt.utils import tooltip
+
+from .highlighter import Cancelled
+
+
+BACKGROUND_MIN_CHARS = 5000  # shorter snippets take less than ~15 ms
+POLL_INTERVAL = 30           # ms
+SHOW_PROGRESS_AFTER = 300    # ms
+
+executor = ThreadPoolExecutor(1)
+job_ids = itertools.count()
+current_job = None
+
+
+class EscFilter(QObject):
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.KeyPress and event.key() == Qt.Key_Escape:
+            self.job.cancel()
+            return True
+        return False
+
+
+class HighlightJob:
+    def __init__(self, editor, render, store, insert, label="", chunked=False, timing=None):
+        """
+        render(cancelled) runs in the thread. store(result) and insert(result) run on the
+        main thread when it's finished, insert only if the result is still relevant.
+        If chunked is True render is called as render(cancelled, emit) and passes the html
+        to emit in chunks. They are sent to the editor as soon as they are there and
+        insert is called as insert(result, job id) to insert them.
+        The time it takes to send the chunks is added to the optional Timing (see
+        timings.py) as "web.eval".
+        """
+        self.editor = editor
+        self.note = editor.note
+        self.field = editor.currentField
+        self.store = store
+        self.insert = insert
+        self.chunked = chunked
+        self.timing = timing
+        self.id = next(job_ids)  # so that chunks of a cancelled job don't get mixed up
+        self.cancelled = threading.Event()
+        self.chunks = queue.Queue()
+        if chunked:
+            self.future = executor.submit(render, self.cancelled, self.chunks.put)
+        else:
+            self.future = executor.submit(render, self.cancelled)
+
+        text = "Highlighting code ... (Esc to cancel)"
+        if label:
+            text += "\n" + label
+        self.progress = QProgressDialog(text, "Cancel", 0, 0, editor.widget)
+        self.progress.setWindowTitle("Syntax Highlighting")
+        self.progress.setWindowModality(Qt.NonModal)
+        self.progress.setAttribute(Qt.WA_ShowWithoutActivating)
+        self.progress.setMinimumDuration(SHOW_PROGRESS_AFTER)
+        self.progress.canceled.connect(self.cancel)
+
+        # the webview gets the key presses through its focus proxy
+        self.esc_filter = EscFilter(self)
+        self.watched = editor.web.focusProxy() or editor.web
+        self.watched.installEventFilter(self.esc_filter)
+
+        # the timer is deleted together with the editor (e.g. when the Add window is
+        # closed before the job is done), the job is dropped then
+        self.timer = QTimer(editor.widget)
+        self.timer.destroyed.connect(self.editor_closed)
+        self.timer.timeout.connect(self.poll)
+        self.timer.start(POLL_INTERVAL)
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def still_relevant(self):
+        return self.editor.note is self.note and self.editor.currentField == self.field
+
+    def editor_closed(self):
+        global current_job
+        self.cancel()
+        if self.timing is not None:
+            self.timing.discard()
+        if current_job is self:
+            current_job = None
+
+    def cleanup(self):
+        global current_job
+        self.timer.stop()
+        if current_job is self:
+            current_job = None
+        try:
+            self.watched.removeEventFilter(self.esc_filter)
+            self.progress.canceled.disconnect(self.cancel)
+            self.progress.reset()
+            self.progress.deleteLater()
+        except RuntimeError:
+            # the widgets of a closed editor are deleted already
+            pass
+
+    def send_chunks(self):
+        while True:
+            try:
+                chunk = self.chunks.get_nowait()
+            except queue.Empty:
+                return
+            if self.cancelled.is_set():
+                continue
+            start = time.perf_counter()
+            self.editor.web.eval("shfAddChunk(%d, %s);" % (self.id, json.dumps(chunk)))
+            if self.timing is not None:
+                self.timing.add("web.eval", time.perf_counter() - start)
+
+    def poll(self):
+        # done() is read before the queue is emptied: the chunks that the thread put before
+        # it finished must all be sent before insert
+        done = self.future.done()
+        if self.chunked:
+            self.send_chunks()
+        if not done:
+            return
+        self.cleanup()
+        try:
+            result = self.future.result()
+        except Cancelled:
+            self.drop()
+            tooltip("Highlighting cancelled.")
+            return
+        except Exception:
+            self.drop()
+            raise
+        # cache the result even if it's not inserted so that it's there if the user tries again
+        self.store(result)
+        if self.cancelled.is_set():
+            self.drop()
+            tooltip("Highlighting cancelled.")
+        elif self.still_relevant():
+            if self.chunked:
+                self.insert(result, self.id)
+            else:
+                self.insert(result)
+        else:
+            self.drop()
+            tooltip("The highlighted code wasn't inserted because another field is active now.")
+
+    def drop(self):
+        # only inserted snippets are recorded, see timings.py
+        if self.timing is not None:
+            self.timing.discard()
+        if self.chunked:
+            self.editor.web.eval("shfDropChunks(%d);" % self.id)
+
+
+def run_in_background(editor, render, store, insert, label="", chunked=False, timing=None):
+    global current_job
+    if current_job is not None:
+        current_job.cancel()
+    current_job = HighlightJob(editor, render, store, insert, label, chunked, timing)
@@ -0,0 +1,455 @@
+"""
+Creating a lexer with get_lexer_by_name() and a HtmlFormatter is surprisingly expensive:
+the lexer lookup may import the lexer module and the formatter rebuilds its
+style-to-css table (for noclasses this is done for every token type of the style).
+In a typical session the same few languages and the same options are used over and over
+so I keep the last used instances around.
+
+Neither lexers nor formatters keep state between calls of pygments.highlight() so it's
+safe to reuse them.
+"""
+
+import copy
+import hashlib
+import io
+import itertools
+import string
+import time
+from functools import lru_cache
+
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+from pygments.token import Text
+
+
+CACHE_SIZE = 32
+CANCEL_CHECK_INTERVAL = 256  # tokens
+SAMPLE_CHARS = 2000          # per sample for estimate_size
+CHUNK_SIZE = 256 * 1024      # characters, for render_chunks
+CENTER_STYLE = "margin: 0 auto;"
+SHORT_CLASS_PREFIX = "_"  # for style_block, see SnippetFormatter
+
+
+class Cancelled(Exception):
+    pass
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def get_lexer(alias, stripall):
+    return get_lexer_by_name(alias, stripall=stripall)
+
+
+class SnippetFormatter(HtmlFormatter):
+    """
+    HtmlFormatter that can set inline styles for the table with the line numbers and for
+    the <code> tag. pygments has no options for them (only for the wrapping <div> and
+    the <pre>), so they were added with bs4 before which took longer than the
+    highlighting itself for long snippets.
+
+    With inline=True the code is wrapped in <span class=..><code>..</code></span> instead
+    of <div class=..><pre>..</pre></div> so that it can be used inside a line of text.
+    Before, render_snippet turned the block into this with a chain of str.replace calls.
+
+    With compact=True the html is smaller but looks the same: pygments puts every token
+    into its own span, also whitespace (e.g. class "w") and tokens with the same class or
+    inline style that are only separated by a space. Whitespace is left bare if its style
+    isn't visible on whitespace anyway (which only a background, underline, border or
+    font family are) and whitespace between two tokens with the same class or style
+    joins them into one span.
+    It's off by default ("compact html" in config.json) because it changes the markup
+    of newly highlighted snippets, e.g. for users who style the "w" spans in their css.
+
+    With style_block=True (only together with noclasses) the token spans don't get a
+    style attribute but a short class like "_a". The prefix keeps them apart from the
+    pygments token classes (like "c" or "k", none starts with "_") that the css in the
+    media folder styles inside the same wrapping <div>. Each snippet contains a <style>
+    with the rules for the classes it uses, so it still doesn't need any css from the
+    note type.
+    The rules are scoped to a class of the wrapping <div> that is made from the hash of
+    all rules of the pygments style. So snippets with different styles on the same card
+    don't affect each other and snippets with the same style have the same rules.
+    """
+    def __init__(self, table_style="", code_style="", inline=False, compact=False, style_block=False,
+                 **options):
+        super().__init__(**options)
+        self.table_style = table_style
+        self.code_style = code_style
+        self.inline = inline
+        self.compact = compact
+        self.style_block = style_block and self.noclasses
+        self._openers = {}
+        self._shows = {}
+        if self.style_block:
+            self._make_short_classes()
+
+    def _make_short_classes(self):
+        # the general token types come first so that they get the shortest names
+        styles = sorted(self.class2style.values(), key=lambda v: (v[2], str(v[1])))
+        styles = list(dict.fromkeys(style for style, _, _ in styles if style))
+        self.short_classes = dict(zip(styles, (SHORT_CLASS_PREFIX + n for n in short_names())))
+        rules = "".join(f"{c}{{{style}}}" for style, c in self.short_classes.items())
+        self.scope = "shf" + hashlib.sha1(rules.encode("utf-8")).hexdigest()[:6]
+
+    def format_unencoded(self, tokensource, outfile):
+        if self.compact:
+            tokensource = self._compacted(tokensource)
+        if self.style_block:
+            # the formatter is shared so the classes of this snippet are kept in a copy
+            snippet = copy.copy(self)
+            snippet.used = {}
+            HtmlFormatter.format_unencoded(snippet, snippet._with_short_classes(tokensource), outfile)
+        else:
+            super().format_unencoded(tokensource, outfile)
+
+    def _with_short_classes(self, tokens):
+        for ttype, value in tokens:
+            style = self._opener(ttype)
+            if style:
+                short = self.short_classes[style]
+                self.used[short] = style
+                # pygments looks up the start tag of the span for each token type here
+                self.span_element_openers[ttype] = f'<span class="{short}">'
+            yield ttype, value
+
+    def _style_tag(self):
+        rules = "".join(f".{self.scope} .{short}{{{style.replace(': ', ':').replace('; ', ';')}}}"
+                        for short, style in sorted(self.used.items()))
+        return f"<style>{rules}</style>"
+
+    def _opener(self, ttype):
+        """the css class or inline style that the span of the token type gets"""
+        try:
+            return self._openers[ttype]
+        except KeyError:
+            if self.noclasses:
+                opener = self._get_css_inline_styles(ttype)
+                opener = opener and self.class2style[opener][0]
+            else:
+                opener = self._get_css_classes(ttype)
+            self._openers[ttype] = opener
+            return opener
+
+    def _shows_on_whitespace(self, ttype):
+        try:
+            return self._shows[ttype]
+        except KeyError:
+            style = self.style.style_for_token(ttype)
+            shows = any(style[k] for k in ("bgcolor", "underline", "border", "roman", "sans", "mono"))
+            self._shows[ttype] = shows
+            return shows
+
+    def _compacted(self, tokens):
+        pending = []  # whitespace since the last other token
+        last = None   # the last other token type
+        for ttype, value in tokens:
+            if value.isspace() and not self._shows_on_whitespace(ttype):
+                pending.append(value)
+                continue
+            if pending:
+                whitespace = "".join(pending)
+                pending = []
+                # spans end at line breaks anyway
+                if (last is not None and "\n" not in whitespace and self._opener(ttype)
+                        and self._opener(last) == self._opener(ttype)
+                        and not self._shows_on_whitespace(last)):
+                    yield last, whitespace
+                else:
+                    yield Text, whitespace
+            yield ttype, value
+            last = ttype
+        if pending:
+            yield Text, "".join(pending)
+
+    def wrap(self, source):
+        if not self.inline:
+            return super().wrap(source)
+        return self._wrap_code(source)
+
+    def _wrap_div(self, inner):
+        wrapped = super()._wrap_div(inner)
+        if not self.inline and not self.style_block:
+            yield from wrapped
+            return
+        t, start = next(wrapped)
+        if self.style_block:
+            start = start.replace(f'class="{self.cssclass}"', f'class="{self.cssclass} {self.scope}"', 1)
+        if self.inline:
+            start = "<span" + start[len("<div"):]
+        yield t, start
+        for t, piece in wrapped:
+            if piece == "</div>\n":
+                # all tokens are formatted now so that the used classes are known
+                if self.style_block:
+                    yield 0, self._style_tag()
+                piece = "</span>" if self.inline else piece
+            yield t, piece
+
+    def _wrap_code(self, inner):
+        if not self.code_style:
+            yield from super()._wrap_code(inner)
+            return
+        yield 0, f'<code style="{self.code_style}">'
+        yield from inner
+        yield 0, '</code>'
+
+    def _wrap_tablelinenos(self, inner):
+        wrapped = super()._wrap_tablelinenos(inner)
+        if not self.table_style:
+            yield from wrapped
+            return
+        # the first piece starts with the opening tag of the table
+        table = f'<table class="{self.cssclass}table"'
+        t, piece = next(wrapped)
+        yield t, piece.replace(table, f'{table} style="{self.table_style}"', 1)
+        yield from wrapped
+
+
+def short_names():
+    """a, b, .., z, aa, ab, .."""
+    for length in itertools.count(1):
+        for letters in itertools.product(string.ascii_lowercase, repeat=length):
+            yield "".join(letters)
+
+
+def get_formatter(style, linenos, cssclass, cssstyles, noclasses, centerfragments=False, font="",
+                  inline=False, compact=False, style_block=False):
+    # lru_cache makes a different key for the same options if they are passed by keyword
+    # in another order or once by keyword and once by position, so they are passed on
+    # by position
+    return _formatter(style, linenos, cssclass, cssstyles, noclasses, centerfragments, font,
+                      inline, compact, style_block)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _formatter(style, linenos, cssclass, cssstyles, noclasses, centerfragments, font, inline,
+               compact, style_block):
+    return SnippetFormatter(
+        cssclass=cssclass,
+        cssstyles=cssstyles,
+        font_size=16,
+        linenos=linenos,
+        # an inline snippet must not contain line breaks
+        lineseparator="" if inline else "<br>",
+        nobackground=False,  # True would solve night mode problem without any config (as long as no line numbers are used)
+        noclasses=noclasses,
+        style=style,
+        wrapcode=True,
+        # to center the table pygments uses for line numbers I need "margin: 0 auto;" on it,
+        # see the comment in render_snippet. Snippets without line numbers get their table
+        # from render_snippet.
+        table_style=CENTER_STYLE if centerfragments and linenos else "",
+        code_style=f"font-family: {font};" if noclasses and font and not inline else "",
+        inline=inline,
+        compact=compact,
+        style_block=style_block)
+
+
+def css_class_for(style, cssclasses, css_custom_class_per_style):
+    if cssclasses and not css_custom_class_per_style:
+        return "highlight"  # the default for pygments
+    else:
+        return f"shf__{style}__highlight"
+
+
+def cache_info():
+    """hits/misses/currsize of the lexer and formatter caches"""
+    return {
+        "lexers": get_lexer.cache_info()._asdict(),
+        "formatters": _formatter.cache_info()._asdict(),
+    }
+
+
+def clear_caches():
+    get_lexer.cache_clear()
+    _formatter.cache_clear()
+
+
+def checked(tokens, cancelled):
+    for i, token in enumerate(tokens):
+        if not i % CANCEL_CHECK_INTERVAL and cancelled.is_set():
+            raise Cancelled
+        yield token
+
+
+def format_code(code, lexer, formatter, out, cancelled=None, timing=None):
+    """
+    formatter.format for the tokens of code. With a Timing (see timings.py) the time
+    spent in the lexer and in the formatter is added to its stages "tokenize" and "format".
+    """
+    if timing is None:
+        tokens = lexer.get_tokens(code)
+    else:
+        start = time.perf_counter()
+        before = timing.stages.get("tokenize", 0.0)
+        with timing.stage("tokenize"):
+            tokens = lexer.get_tokens(code)
+        tokens = timing.timed_tokens(tokens, "tokenize")
+    if cancelled is not None:
+        tokens = checked(tokens, cancelled)
+    formatter.format(tokens, out)
+    if timing is not None:
+        elapsed = time.perf_counter() - start
+        # the time of the lexer is an estimate that can be a bit too high
+        tokenized = min(timing.stages["tokenize"] - before, elapsed)
+        timing.stages["tokenize"] = before + tokenized
+        timing.add("format", elapsed - tokenized)
+
+
+def highlight(code, lexer, formatter, cancelled=None, timing=None):
+    """like pygments.highlight, raises Cancelled soon after the event cancelled is set"""
+    out = io.StringIO()
+    format_code(code, lexer, formatter, out, cancelled, timing)
+    return out.getvalue()
+
+
+def render_snippet(code, lexer, formatter, inline, linenos, centerfragments, noclasses, css_class,
+                   cancelled=None, timing=None):
+    """
+    returns the html that is inserted into the editor. cancelled is an optional
+    threading.Event to stop when the snippet is highlighted in a background thread.
+    timing is an optional Timing, see timings.py.
+    """
+    pygmntd = highlight(code, lexer, formatter, cancelled, timing).rstrip()
+    start = time.perf_counter()
+    # when using noclasses/inline styling pygments adds line-height 125%, see
+    # see https://github.com/pygments/pygments/blob/2fe2152377e317fd215776b6d7467bda3e8cda28/pygments/formatters/html.py#L269
+    # It's seems to be only relevant for IE and makes the line numbers misaligned on my PC. So I remove it.
+    if noclasses and not inline:
+        pygmntd = pygmntd.replace('line-height: 125%;', '')
+    if inline:
+        # the formatter from get_formatter(.., inline=True) already makes a <span>, see
+        # SnippetFormatter
+        pretty_code = pygmntd
+    else:
+        if linenos:
+            pretty_code = "".join([pygmntd, "<br>"])
+        # to show line numbers pygments uses a table. The background color for the code
+        # highlighting is limited to this table
+        # If pygments doesn't use linenumbers it doesn't use a table. This means
+        # that the background color covers the whole width of the card.
+        # I don't like this. I didn't find an easier way than reusing the existing
+        # solution.
+        # Glutanimate removed the table in the commit
+        # https://github.com/glutanimate/syntax-highlighting/commit/afbf5b3792611ecd2207b9975309d05de3610d45
+        # which hasn't been published on Ankiweb in 2019-10-02.
+        else:
+            table_style = f' style="{CENTER_STYLE}"' if centerfragments else ""
+            pretty_code = "".join([f'<table class="{css_class}table"{table_style}><tbody><tr><td>',
+                                    pygmntd,
+                                    "</td></tr></tbody></table><br>"])
+        """
+        I can't solely rely on the pygments-HTMLFormatter
+        A lot of the stuff I did before 2020-11 with bs4 can indeed be done by adjusting
+        the HTMLFormatter options:
+        - I can override the ".card {text-align: center}" by using the option "cssstyles"
+          (Inline CSS styles for the wrapping <div> tag).
+        - I can set a custom class by adjusting the option "cssclass" which defaults to "highlight"
+          Besides this there are the classes linenos and linenodiv. BUT I don't need to customize 
+          the latter classes. I can also work with longer css rules: 
+             /*syntax highlighting fork add-on: dark background*/
+             .night_mode .shf__default__highlight{
+             background-color: #222222 !important;
+             }
+             /*syntax highlighting fork add-on: line numbers: white on black: sometimes a span is used, sometimes not*/
+             .night_mode .shf__default__highlighttable tr td.linenos div.linenodiv pre span {
+             background-color: #222222 !important;
+             color: #f0f0f0 !important;
+             }
+             .night_mode .shf__default__highlighttable tr td.linenos div.linenodiv pre {
+             background-color: #222222 !important;
+             color: #f0f0f0 !important;
+             }
+        BUT as far as I see I can't set inline styling for the surrounding table. But to center the
+        table I need to add something like "margin: 0 auto;". If you rely on css it's easy because
+        the "the wrapping table will have a CSS class of [the cssclass] string plus 'table', the 
+        default is accordingly 'highlighttable'.". But my option should work without the user
+        adjusting each template and the editor.
+        I also need to set the font.
+        Until 2021 I added these styles with bs4 which took longer than the highlighting
+        itself. Now the formatter from get_formatter adds them, see SnippetFormatter.
+        """
+    # remember the language so that the snippet can be highlighted again later, e.g.
+    # with different settings, see rehighlight.py
+    tagend = pretty_code.index(" ")
+    pretty_code = f'{pretty_code[:tagend]} data-shf-lang="{lexer.aliases[0]}"{pretty_code[tagend:]}'
+    if timing is not None:
+        timing.add("post-processing", time.perf_counter() - start)
+    return pretty_code
+
+
+def estimate_size(code, lexer, formatter, samples=3):
+    """
+    the estimated size in bytes of the html that pygments makes from code. Only a few
+    samples from the beginning, the middle and the end of long code are highlighted.
+    """
+    if len(code) <= SAMPLE_CHARS * samples:
+        return len(highlight(code, lexer, formatter).encode("utf-8"))
+    step = len(code) // samples
+    in_bytes = out_bytes = 0
+    for i in range(samples):
+        # samples start and end at line breaks so that most tokens are complete
+        start = code.rfind("\n", 0, i * step) + 1
+        end = code.find("\n", start + SAMPLE_CHARS)
+        sample = code[start:end if end != -1 else len(code)]
+        in_bytes += len(sample.encode("utf-8"))
+        out_bytes += len(highlight(sample, lexer, formatter).encode("utf-8"))
+    return int(len(code.encode("utf-8")) * out_bytes / max(in_bytes, 1))
+
+
+class ChunkWriter:
+    """file object for HtmlFormatter.format that passes the output on in chunks"""
+    def __init__(self, emit, edit, chunk_size):
+        self.emit = emit
+        self.edit = edit
+        self.chunk_size = chunk_size
+        self.parts = []
+        self.size = 0
+        self.first = True
+
+    def write(self, s):
+        # the formatter writes whole lines or tags so a chunk never ends inside a tag
+        self.parts.append(s)
+        self.size += len(s)
+        if self.size >= self.chunk_size:
+            self.flush()
+
+    def flush(self, final=False):
+        text = "".join(self.parts)
+        # whitespace at the end is kept back because the end of the output is stripped
+        body = text.rstrip()
+        rest = "" if final else text[len(body):]
+        self.parts = [rest] if rest else []
+        self.size = len(rest)
+        if body:
+            self.emit(self.edit(body, self.first))
+            self.first = False
+
+
+def render_chunks(code, lexer, formatter, emit, linenos, centerfragments, noclasses, css_class,
+                  chunk_size=CHUNK_SIZE, cancelled=None, timing=None):
+    """
+    like render_snippet for huge snippets (but not for inline snippets): the html is
+    passed to emit in chunks of about chunk_size characters instead of building one
+    string. The changes that render_snippet makes to the whole html are made to the
+    chunks.
+    """
+    attributes = f' data-shf-lang="{lexer.aliases[0]}"'
+    # the formatter only styles its own table, see get_formatter
+    table_style = f' style="{CENTER_STYLE}"' if centerfragments else ""
+
+    def edit(html, first):
+        if noclasses:
+            html = html.replace('line-height: 125%;', '')
+        if first:
+            if linenos:
+                # like in render_snippet the attribute goes into the outermost tag
+                tagend = html.index(" ")
+                html = html[:tagend] + attributes + html[tagend:]
+            else:
+                html = f'<table{attributes} class="{css_class}table"{table_style}><tbody><tr><td>' + html
+        return html
+
+    writer = ChunkWriter(emit, edit, chunk_size)
+    format_code(code, lexer, formatter, writer, cancelled, timing)
+    writer.flush(final=True)
+    emit("<br>" if linenos else "</td></tr></tbody></table><br>")
@@ -0,0 +1,224 @@
+"""
+Guess the language of a code snippet for the "detect" entry of the helper menu.
+
+pygments.lexers.guess_lexer calls analyse_text of every lexer (more than 500) which takes
+too long for a menu. Most lexers don't implement analyse_text anyway so the result is
+often wrong. This detector only considers the languages the user actually uses (the
+default language, the favorites and the deck default languages) and checks in this order
+- a shebang line ("#!/usr/bin/env python3"),
+- a vim or emacs modeline,
+- which of the candidates has the most keywords in the snippet. The keywords of each
+  language are taken from the token definitions of its lexer once. Keywords that many
+  candidates have in common count less.
+- analyse_text, but only for the few candidates with the most keywords.
+Languages without keywords (e.g. HTML) are scored on their own: with analyse_text and
+the share of the snippet that their lexer doesn't treat as plain text.
+Only the first SAMPLE_CHARS characters are looked at. The detection stops when the time
+budget is used up and returns what it has found so far.
+
+Results are cached by the hash of the snippet.
+"""
+
+import collections
+import functools
+import hashlib
+import math
+import re
+import time
+
+from pygments.lexer import RegexLexer, words
+from pygments.lexers import find_lexer_class_by_name
+from pygments.modeline import get_filetype_from_buffer
+from pygments.token import Error, Keyword, Name, Operator, Other, Text, _TokenType
+from pygments.util import ClassNotFound
+
+
+BUDGET = 0.05         # seconds
+ANALYSE_TEXT_MAX = 3  # number of candidates for which analyse_text is called
+SAMPLE_CHARS = 20000  # a 2 MB paste took 130 ms just to find the identifiers
+MARKUP_CHARS = 2000   # characters that are lexed for languages without keywords
+# analyse_text results of languages without keywords from here on beat matches of
+# keywords only. Languages with keywords aren't trusted with this, e.g. the analyse_text
+# of T-SQL returns 0.5 for the C and Go files in benchmarks/corpus
+STRONG = 0.5
+CACHE_SIZE = 256
+
+Detection = collections.namedtuple("Detection", "alias name confidence method")
+
+shebang = re.compile(r"^#!\s*(\S+)(?:\s+(\S+))?")
+identifier = re.compile(r"[A-Za-z_][A-Za-z0-9_]+")
+escape = re.compile(r"\\.")
+
+# interpreters whose name isn't an alias of a lexer
+interpreters = {
+    "node": "javascript",
+    "nodejs": "javascript",
+    "osascript": "applescript",
+    "pwsh": "powershell",
+}
+
+_cache = collections.OrderedDict()
+
+
+def lexer_class(alias):
+    try:
+        return find_lexer_class_by_name(alias)
+    except ClassNotFound:
+        return None
+
+
+def from_shebang(code):
+    m = shebang.match(code)
+    if not m:
+        return None
+    name = m.group(1).rsplit("/", 1)[-1]
+    if name == "env" and m.group(2):
+        name = m.group(2)
+    for candidate in (name, name.rstrip("0123456789.")):
+        candidate = interpreters.get(candidate, candidate)
+        cls = lexer_class(candidate)
+        if cls:
+            return cls
+    return None
+
+
+def from_modeline(code):
+    filetype = get_filetype_from_buffer(code)
+    return lexer_class(filetype) if filetype else None
+
+
+def token_types(action):
+    if isinstance(action, _TokenType):
+        return [action]
+    # bygroups(Keyword, Text) returns a function that keeps the token types in a closure
+    types = []
+    for cell in getattr(action, "__closure__", None) or ():
+        if isinstance(cell.cell_contents, tuple):
+            types.extend(t for t in cell.cell_contents if isinstance(t, _TokenType))
+    return types
+
+
+def is_keyword(token):
+    return token in Keyword or token in Name.Builtin or token in Operator.Word
+
+
+@functools.lru_cache(maxsize=None)
+def keywords(alias):
+    """the keywords and builtins of the language as they are defined in its lexer"""
+    cls = lexer_class(alias)
+    found = set()
+    if cls is None or not issubclass(cls, RegexLexer):
+        return frozenset()
+    ignorecase = bool(cls.flags & re.IGNORECASE)
+    for klass in cls.__mro__:
+        for rules in klass.__dict__.get("tokens", {}).values():
+            for rule in rules:
+                if not isinstance(rule, tuple) or len(rule) < 2:
+                    continue
+                regex, token = rule[0], rule[1]
+                if not any(is_keyword(t) for t in token_types(token)):
+                    continue
+                if isinstance(regex, words):
+                    found.update(regex.words)
+                elif isinstance(regex, str):
+                    found.update(identifier.findall(escape.sub(" ", regex)))
+    if ignorecase:
+        found = {w.lower() for w in found}
+    return frozenset(found)
+
+
+def keyword_scores(code, aliases, deadline=math.inf):
+    """candidates that weren't scored before the deadline get 0"""
+    counts = collections.Counter(identifier.findall(code))
+    lower_counts = collections.Counter()
+    for word, count in counts.items():
+        lower_counts[word.lower()] += count
+    sets = {alias: keywords(alias) for alias in aliases}
+    document_frequency = collections.Counter(w for s in sets.values() for w in s)
+    scores = dict.fromkeys(aliases, 0.0)
+    for alias, kws in sets.items():
+        if time.perf_counter() > deadline:
+            break
+        if not kws:
+            # also lexers that aren't RegexLexers (e.g. html+django), they have no flags
+            continue
+        used = lower_counts if lexer_class(alias).flags & re.IGNORECASE else counts
+        score = 0.0
+        for word, count in used.items():
+            if word in kws:
+                # words that all candidates know still count a little
+                weight = math.log(len(sets) / document_frequency[word]) + 0.1
+                score += weight * (1 + math.log(count))
+        # languages with many keywords (like SQL) would otherwise match everything
+        scores[alias] = score / math.sqrt(len(kws))
+    return scores
+
+
+def markup_score(code, alias):
+    """share of the characters that the lexer doesn't treat as plain text"""
+    sample = code[:MARKUP_CHARS]
+    if not sample.strip():
+        return 0.0
+    marked = 0
+    for _, token, value in lexer_class(alias)().get_tokens_unprocessed(sample):
+        if not (token in Text or token in Error or token in Other):
+            marked += len(value.strip())
+    return marked / len(sample.strip())
+
+
+def _detect(code, aliases, deadline):
+    for method, find in (("shebang", from_shebang), ("modeline", from_modeline)):
+        cls = find(code)
+        if cls:
+            return Detection(cls.aliases[0], cls.name, 1.0, method)
+    aliases = [a for a in aliases if lexer_class(a)]
+    if not aliases:
+        return None
+    scores = keyword_scores(code, aliases, deadline)
+    total = sum(scores.values())
+    combined = {a: (s / total if total else 0.0) for a, s in scores.items()}
+    methods = dict.fromkeys(aliases, "keywords")
+    strong = []
+    ranked = sorted(aliases, key=lambda a: scores[a], reverse=True)
+    # languages without keywords (e.g. HTML) would always lose against the keyword share
+    # of the others so they are scored on their own
+    without_keywords = [a for a in ranked if not keywords(a)]
+    to_analyse = [a for a in ranked if keywords(a)][:ANALYSE_TEXT_MAX] + without_keywords
+    for alias in to_analyse:
+        if time.perf_counter() > deadline:
+            break
+        analysed = lexer_class(alias).analyse_text(code)
+        if alias in without_keywords:
+            if analysed >= STRONG:
+                strong.append(alias)
+            combined[alias] = max(analysed, markup_score(code, alias))
+            methods[alias] = "analyse_text and markup"
+        elif analysed:
+            combined[alias] = (combined[alias] + analysed) / 2 if total else analysed
+            methods[alias] = "keywords and analyse_text" if total else "analyse_text"
+    best = max(ranked, key=lambda a: combined[a])
+    if strong and methods[best] == "keywords":
+        # e.g. the doctype of HTML in a page with English text
+        best = max(strong, key=lambda a: combined[a])
+    if not combined[best]:
+        return None
+    return Detection(best, lexer_class(best).name, min(1.0, combined[best]), methods[best])
+
+
+def detect(code, aliases, budget=BUDGET):
+    """
+    returns a Detection with the alias and name of the most likely language of the code
+    and a confidence between 0 and 1, or None if the code doesn't look like any of the
+    languages. aliases are the candidates.
+    """
+    deadline = time.perf_counter() + budget
+    code = code[:SAMPLE_CHARS]
+    key = (hashlib.sha1(code.encode("utf-8")).hexdigest(), tuple(aliases))
+    if key in _cache:
+        _cache.move_to_end(key)
+        return _cache[key]
+    result = _detect(code, aliases, deadline)
+    _cache[key] = result
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return result
@@ -0,0 +1,90 @@
+"""
+Index of all languages pygments knows about.
+
+pygments.lexers.get_all_lexers() walks all builtin lexers and the lexers from plugins
+(which means scanning the installed packages for entry points). This takes more than
+half a second so I don't want to do this while Anki starts. The index is built on first
+access and stored in the user_files folder. It's rebuilt when the pygments version changes.
+
+For each language the index contains the name and the aliases, filename globs and
+mimetypes from pygments.
+"""
+
+import json
+import os
+
+import pygments
+
+from .config import snapshot, user_files_folder
+
+
+index_file = os.path.join(user_files_folder, "language_index.json")
+
+_index = None
+_lang_map = None
+
+
+def _build_index():
+    from pygments.lexers import get_all_lexers
+    index = []
+    for name, aliases, filenames, mimetypes in get_all_lexers():
+        # some lexers have no alias so that get_lexer_by_name can't find them
+        if aliases:
+            index.append({
+                "name": name,
+                "aliases": list(aliases),
+                "filenames": list(filenames),
+                "mimetypes": list(mimetypes),
+            })
+    return index
+
+
+def _load_index():
+    try:
+        with open(index_file, encoding="utf-8") as f:
+            content = json.load(f)
+        if content.get("pygments") == pygments.__version__:
+            return content["languages"]
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+    index = _build_index()
+    try:
+        os.makedirs(user_files_folder, exist_ok=True)
+        with open(index_file, "w", encoding="utf-8") as f:
+            json.dump({"pygments": pygments.__version__, "languages": index}, f)
+    except OSError as e:
+        print(f"syntax highlighting: couldn't save language index: {e}")
+    return index
+
+
+def language_index():
+    global _index
+    if _index is None:
+        _index = _load_index()
+    return _index
+
+
+def lang_map():
+    """
+    correspondence between the "language names": long, descriptive names we want to show
+    the user AND the "language aliases": short, cryptic names for internal use by the lexers
+    """
+    global _lang_map
+    if _lang_map is None:
+        _lang_map = {lang["name"]: lang["aliases"][0] for lang in language_index()}
+    return _lang_map
+
+
+def usual_aliases(*names):
+    """
+    aliases of the languages the user usually uses: the given language names, the default
+    language, the favorites and the default languages of decks, note types and fields
+    """
+    langs = lang_map()
+    conf = snapshot()
+    wanted = [*names, conf.defaultlang, *conf.favorites, *conf.deckdefaultlang.values(),
+              *conf.notetypedefaultlang.values()]
+    for fields in conf.fielddefaultlang.values():
+        if isinstance(fields, dict):
+            wanted.extend(fields.values())
+    return list(dict.fromkeys(langs[n] for n in wanted if n in langs))
@@ -0,0 +1,53 @@
+"""
+Load the lexers and the formatter that will probably be needed in a background thread
+after the profile is loaded.
+
+The first hilcd of a session used to be slow: it imported the modules that are imported
+on first use (see benchmarks/import_time.py), imported the module of the lexer, compiled
+the regexes of the lexer and built the style table of the formatter. Lexers and formatters
+are cached (see highlighter.py) so when the thread already created them the first hilcd
+costs as much as later ones (see benchmarks/first_highlight.py).
+
+Python threads have no priority so the thread waits START_DELAY seconds until the start
+of Anki is over and pauses after each step to let the main thread run. hilcd calls
+stop() so that the thread doesn't compete with the highlighting. Opening the helper menu
+doesn't stop it: while the user chooses a language the main thread is idle.
+"""
+
+import threading
+
+
+START_DELAY = 2  # seconds
+PAUSE = 0.02     # seconds between two steps
+
+_stop = threading.Event()
+_thread = None
+
+
+def start(steps):
+    """
+    runs the generator function steps in a daemon thread, the thread stops at the next
+    yield after stop() was called. Only the first call starts a thread.
+    """
+    global _thread
+    if _thread is not None:
+        return
+    _thread = threading.Thread(target=_run, args=(steps,), name="syntax highlighting prewarm", daemon=True)
+    _thread.start()
+
+
+def stop():
+    _stop.set()
+
+
+def _run(steps):
+    if _stop.wait(START_DELAY):
+        return
+    try:
+        for _ in steps():
+            if _stop.wait(PAUSE):
+                return
+    except Exception as e:
+        # e.g. a language of the config that pygments doesn't know (anymore). hilcd shows
+        # an error when it's used
+        print(f"syntax highlighting: prewarm stopped: {e!r}")
@@ -0,0 +1,244 @@
+"""
+Highlight the code snippets in existing notes again with the current settings, e.g.
+after changing the style or after an update of pygments.
+
+The notes are processed in batches: the main thread loads the notes of a batch and
+hands the fields that contain snippets to a pool of worker processes (see
+rehighlight_worker.py). When the results of a batch are available they are written
+back and saved so that a cancelled run keeps what was done until then.
+
+This file is imported by the menu entries in rehighlight_menu.py when they are used.
+"""
+
+import collections
+import json
+import os
+import queue
+import subprocess
+import sys
+import time
+
+from aqt import mw
+from aqt.qt import *
+from aqt.utils import askUser, showInfo, tooltip
+
+from .config import snapshot
+from .languages import lang_map, usual_aliases
+
+
+worker_script = os.path.join(os.path.dirname(__file__), "rehighlight_worker.py")
+
+BATCH_SIZE = 100  # notes
+SEARCH = '"shf__*__highlight" or data-shf-lang'
+
+
+class ProcessPool:
+    """
+    worker processes that run rehighlight_worker.py. Each worker process is fed by a
+    thread that just waits for the answer so that the gui stays responsive.
+    """
+    def __init__(self, python, size):
+        self.python = python
+        self.size = size
+        self.idle = queue.Queue()
+        self.procs = []
+        for _ in range(size):
+            proc = self._start()
+            self.procs.append(proc)
+            self.idle.put(proc)
+        from concurrent.futures import ThreadPoolExecutor
+        self.executor = ThreadPoolExecutor(size)
+
+    def _start(self):
+        return subprocess.Popen(
+            [self.python, worker_script],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            encoding="utf-8",
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+
+    def _replace(self, proc):
+        """a new process for one that died, the old one if that fails"""
+        proc.kill()
+        proc.wait()
+        try:
+            new = self._start()
+        except OSError:
+            # the batches that get it fail right away but are still reported
+            return proc
+        self.procs[self.procs.index(proc)] = new
+        return new
+
+    def _run(self, options, fields):
+        proc = self.idle.get()
+        try:
+            proc.stdin.write(json.dumps({"options": options, "fields": fields}) + "\n")
+            proc.stdin.flush()
+            answer = proc.stdout.readline()
+            if not answer:
+                raise RuntimeError("worker process for re-highlighting died")
+            return json.loads(answer)["results"]
+        except (OSError, ValueError, RuntimeError):
+            proc = self._replace(proc)
+            raise
+        finally:
+            self.idle.put(proc)
+
+    def submit(self, options, fields):
+        return self.executor.submit(self._run, options, fields)
+
+    def close(self):
+        for proc in self.procs:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+        self.executor.shutdown(wait=False)
+        for proc in self.procs:
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+class InProcessPool:
+    """fallback if there's no python interpreter to start worker processes"""
+    size = 1
+
+    def __init__(self):
+        from concurrent.futures import ThreadPoolExecutor
+        self.executor = ThreadPoolExecutor(1)
+
+    def submit(self, options, fields):
+        # bs4 takes long to import, see benchmarks/import_time.py
+        from .rehighlight_worker import rehighlight_fields
+        return self.executor.submit(rehighlight_fields, options, fields)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+def make_pool():
+    # in the official builds of Anki sys.executable is Anki itself and not python
+    if not getattr(sys, "frozen", False) and sys.executable:
+        try:
+            return ProcessPool(sys.executable, max(1, (os.cpu_count() or 2) - 1))
+        except OSError as e:
+            print(f"syntax highlighting: couldn't start worker processes: {e}")
+    return InProcessPool()
+
+
+def current_options():
+    from .highlighter import css_class_for
+    langs = lang_map()
+    conf = snapshot()
+    noclasses = not conf.cssclasses
+    return {
+        "style": conf.style,
+        "linenos": conf.linenos,
+        "centerfragments": conf.centerfragments,
+        "noclasses": noclasses,
+        "css_class": css_class_for(conf.style, conf.cssclasses, conf.css_custom_class_per_style),
+        "cssstyles": "text-align: left;" if noclasses else "",
+        "font": conf.font,
+        "compact": conf.compact_html,
+        "style_block": noclasses and conf.style_block_instead_of_inline_styles,
+        "stripall": not conf.remove_leading_spaces_if_possible,
+        "defaultlang": langs.get(conf.defaultlang, "python"),
+        "candidates": usual_aliases(),
+    }
+
+
+def rehighlight_notes(nids, parent):
+    from concurrent.futures import TimeoutError
+    options = current_options()
+    pool = make_pool()
+    progress = QProgressDialog("Highlighting code again ...", "Cancel", 0, len(nids), parent)
+    progress.setWindowTitle("Syntax Highlighting")
+    progress.setWindowModality(Qt.WindowModal)
+    progress.setMinimumDuration(0)
+    progress.setValue(0)
+    start = time.time()
+    pending = collections.deque()
+    pos = done = changed_notes = snippets = failed = 0
+    error = None
+    try:
+        while (pos < len(nids) or pending) and not progress.wasCanceled():
+            # keep the workers busy while the results of earlier batches are saved
+            while pos < len(nids) and len(pending) < 2 * pool.size:
+                batch = nids[pos:pos + BATCH_SIZE]
+                pos += len(batch)
+                notes = {}
+                fields = []
+                for nid in batch:
+                    note = mw.col.getNote(nid)
+                    notes[nid] = note
+                    for idx, html in enumerate(note.fields):
+                        if "shf__" in html or "data-shf-lang" in html:
+                            fields.append([[nid, idx], html])
+                pending.append((notes, pool.submit(options, fields)))
+            notes, future = pending[0]
+            try:
+                results = future.result(timeout=0.05)
+            except TimeoutError:
+                QApplication.processEvents()
+                continue
+            except Exception as e:
+                # e.g. a worker process that died, the other batches go on
+                pending.popleft()
+                failed += len(notes)
+                error = e
+                progress.setValue(done + failed)
+                continue
+            pending.popleft()
+            changed = set()
+            for (nid, idx), new, count in results:
+                if new is not None and new != notes[nid].fields[idx]:
+                    notes[nid].fields[idx] = new
+                    changed.add(nid)
+                    snippets += count
+            for nid in changed:
+                notes[nid].flush()
+            mw.col.save()
+            changed_notes += len(changed)
+            done += len(notes)
+            progress.setValue(done + failed)
+            QApplication.processEvents()
+    finally:
+        pool.close()
+        progress.close()
+    elapsed = max(time.time() - start, 0.001)
+    mw.reset()
+    msg = (f"Processed {done} of {len(nids)} notes in {elapsed:.1f} seconds "
+           f"({done / elapsed:.0f} notes per second).\n\n"
+           f"{snippets} code snippets in {changed_notes} notes were changed.")
+    if failed:
+        msg += f"\n\n{failed} notes couldn't be processed and weren't changed ({error})."
+    showInfo(msg, parent=parent)
+
+
+def confirm(count):
+    msg = (f"Highlight the code in {count} notes again with the current settings "
+           "of this add-on?\n\nThis can't be undone. Make sure you have a backup "
+           "of your collection.")
+    return askUser(msg)
+
+
+def on_rehighlight_all():
+    nids = mw.col.find_notes(SEARCH)
+    if not nids:
+        tooltip("No notes with highlighted code found.")
+        return
+    if confirm(len(nids)):
+        rehighlight_notes(nids, mw)
+
+
+def on_rehighlight_selected(browser):
+    selected = set(browser.selectedNotes())
+    nids = [nid for nid in mw.col.find_notes(SEARCH) if nid in selected]
+    if not nids:
+        tooltip("No highlighted code in the selected notes.")
+        return
+    if confirm(len(nids)):
+        rehighlight_notes(nids, browser)
+
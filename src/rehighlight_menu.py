@@ -0,0 +1,31 @@
+"""
+The menu entries of rehighlight.py. They are added at startup but rehighlight.py (with
+subprocess etc.) is only imported when one of them is used.
+"""
+
+from aqt import mw
+from aqt.qt import *
+from anki.hooks import addHook
+
+
+def on_rehighlight_all():
+    from .rehighlight import on_rehighlight_all
+    on_rehighlight_all()
+
+
+def on_rehighlight_selected(browser):
+    from .rehighlight import on_rehighlight_selected
+    on_rehighlight_selected(browser)
+
+
+def setup_browser_menu(browser):
+    a = QAction("Highlight Code Again (Syntax Highlighting)", browser)
+    a.triggered.connect(lambda _, b=browser: on_rehighlight_selected(b))
+    browser.form.menuEdit.addSeparator()
+    browser.form.menuEdit.addAction(a)
+addHook("browser.setupMenus", setup_browser_menu)
+
+
+action = QAction("Highlight Code in All Notes Again (Syntax Highlighting)", mw)
+action.triggered.connect(on_rehighlight_all)
+mw.form.menuTools.addAction(action)
@@ -0,0 +1,181 @@
+"""
+Highlight code snippets that are already in notes again with the current settings.
+
+rehighlight.py runs this file as a separate process (one per cpu core) and sends
+batches of fields as json lines over stdin. The answers are written to stdout. The
+functions can also be used directly if there's no python interpreter for the worker
+processes (which is the case in the official builds of Anki).
+"""
+
+import json
+import os
+import re
+import sys
+from html.parser import HTMLParser
+
+if __package__:
+    from .highlighter import get_formatter, get_lexer, render_snippet
+    from .language_detection import detect
+else:
+    # started as a script by rehighlight.py
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "libs"))
+    from highlighter import get_formatter, get_lexer, render_snippet
+    from language_detection import detect
+
+from bs4 import BeautifulSoup
+from pygments.util import ClassNotFound
+
+
+block_class = re.compile(r"^shf__[\w-]+__highlight(table)?$")
+
+
+def is_block(tag):
+    if tag.has_attr("data-shf-lang"):
+        return True
+    return any(block_class.match(c) for c in tag.get("class", []))
+
+
+# tags without an end tag
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+             "param", "source", "track", "wbr"}
+
+
+class BlockFinder(HTMLParser):
+    """
+    the positions of the outermost snippets in the field. Only these parts are replaced,
+    the rest of the field keeps its markup exactly as it is (BeautifulSoup would write it
+    again with its own quoting, entities etc.).
+    """
+    def __init__(self, html):
+        super().__init__(convert_charrefs=False)
+        self.html = html
+        self.line_starts = [0] + [m.end() for m in re.finditer("\n", html)]
+        self.stack = []      # names of the open tags
+        self.block = None    # (start, depth) of the snippet that is open
+        self.spans = []      # (start, end)
+        self.feed(html)
+        self.close()
+
+    def position(self):
+        line, col = self.getpos()
+        return self.line_starts[line - 1] + col
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        if self.block is None:
+            attrs = dict(attrs)
+            classes = (attrs.get("class") or "").split()
+            if "data-shf-lang" in attrs or any(block_class.match(c) for c in classes):
+                self.block = (self.position(), len(self.stack))
+        self.stack.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in self.stack:
+            return
+        # tags that weren't closed (like <p> or <li>) end with their parent
+        while self.stack.pop() != tag:
+            pass
+        if self.block is not None and len(self.stack) == self.block[1]:
+            end = self.html.index(">", self.position()) + 1
+            self.spans.append((self.block[0], end))
+            self.block = None
+
+
+def block_spans(html):
+    return BlockFinder(html).spans
+
+
+def extract_code(block):
+    for td in block.select("td.linenos"):
+        td.decompose()
+    # the css of snippets with a style block, see SnippetFormatter in highlighter.py
+    for style in block.find_all("style"):
+        style.decompose()
+    for br in block.find_all("br"):
+        br.replace_with("\n")
+    return block.get_text()
+
+
+def guess_lang(code, candidates, default):
+    # snippets inserted by older versions of this add-on don't contain the language.
+    # pygments.lexers.guess_lexer tries all lexers which is slow and often wrong so I
+    # only consider the languages the user usually uses.
+    detection = detect(code, candidates)
+    return detection.alias if detection else default
+
+
+def rehighlight_block(html, options):
+    """the new html for the html of one snippet or None if its language is unknown"""
+    block = BeautifulSoup(html, "html.parser").find(is_block)
+    inline = block.name == "span"
+    code = extract_code(block)
+    lang = block.get("data-shf-lang") or guess_lang(code, options["candidates"], options["defaultlang"])
+    linenos = options["linenos"] and not inline
+    try:
+        lexer = get_lexer(lang, stripall=options["stripall"])
+        formatter = get_formatter(
+            style=options["style"],
+            linenos=linenos,
+            cssclass=options["css_class"],
+            cssstyles=options["cssstyles"],
+            noclasses=options["noclasses"],
+            centerfragments=options["centerfragments"],
+            font=options["font"],
+            inline=inline,
+            compact=options["compact"],
+            style_block=options["style_block"])
+    except ClassNotFound:
+        return None
+    pretty_code = render_snippet(code, lexer, formatter, inline=inline, linenos=linenos,
+                                 centerfragments=options["centerfragments"],
+                                 noclasses=options["noclasses"],
+                                 css_class=options["css_class"])
+    # the <br> that hilcd inserts after the snippet is still in the field
+    for br in ("<br>", "<br/>"):
+        if pretty_code.endswith(br):
+            return pretty_code[:-len(br)]
+    return pretty_code
+
+
+def rehighlight_field(html, options):
+    """returns the new field content and the number of re-highlighted snippets"""
+    pieces = []
+    last = count = 0
+    for start, end in block_spans(html):
+        new = rehighlight_block(html[start:end], options)
+        if new is None:
+            continue
+        pieces += [html[last:start], new]
+        last = end
+        count += 1
+    if not count:
+        return None, 0
+    pieces.append(html[last:])
+    return "".join(pieces), count
+
+
+def rehighlight_fields(options, fields):
+    """fields is a list of [key, html], returns a list of [key, new html or None, count]"""
+    results = []
+    for key, html in fields:
+        try:
+            new, count = rehighlight_field(html, options)
+        except Exception as e:
+            # a single broken field shouldn't stop the whole run
+            print(f"syntax highlighting: couldn't re-highlight field: {e!r}", file=sys.stderr)
+            new, count = None, 0
+        results.append([key, new, count])
+    return results
+
+
+def main():
+    for line in sys.stdin:
+        request = json.loads(line)
+        results = rehighlight_fields(request["options"], request["fields"])
+        sys.stdout.write(json.dumps({"results": results}) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
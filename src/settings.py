@@ -1,4 +1,3 @@
-from pygments.lexers import get_all_lexers
 from pygments.styles import get_all_styles
 
 import os
@@ -11,10 +10,9 @@ from .config import ex_html_edi
 from .forms import syntax_settings
 from .forms import deck_default
 from .fuzzy_panel import FilterDialog
+from .languages import lang_map
 from .checkdialog import CheckDialog
-
-
-LANGUAGES_MAP = {lex[0]: lex[1][0] for lex in get_all_lexers()}
+from .diagnostics import DiagnosticsDialog
 
 
 class DefaultForDeckAdd(QDialog):
@@ -40,7 +38,7 @@ class DefaultForDeckAdd(QDialog):
             self.dialog.ql_deck.setText(d.selkey)
 
     def onLang(self):
-        d = FilterDialog(parent=self, values=list(LANGUAGES_MAP.keys()))
+        d = FilterDialog(parent=self, values=list(lang_map().keys()))
         if d.exec():
             self.dialog.ql_lang.setText(d.selkey)
 
@@ -85,6 +83,13 @@ class MyConfigWindow(QDialog):
         self.dialog.cb_defaultlangperdeck.stateChanged.connect(self.ondeckdefaultchange)
         self.dialog.pb_updateTemplates.clicked.connect(self.onupdatetemplates)
         self.dialog.pb_edit_css_file.clicked.connect(self.edit_css_file)
+        # see diagnostics.py
+        pb_timings = self.dialog.buttonBox.addButton("Timings ...", QDialogButtonBox.ActionRole)
+        pb_timings.clicked.connect(self.show_timings)
+
+    def show_timings(self):
+        d = DiagnosticsDialog(self)
+        d.exec()
 
     def edit_css_file(self):
         mediafolder = os.path.join(aqt.mw.pm.profileFolder(), "collection.media")
@@ -190,7 +195,7 @@ class MyConfigWindow(QDialog):
         lw.setCurrentRow(row + arg)
 
     def onListAdd(self):
-        d = FilterDialog(parent=None, values=LANGUAGES_MAP)
+        d = FilterDialog(parent=None, values=lang_map())
         if d.exec():
             self.dialog.lw_favs.addItem(d.selkey)
 
@@ -199,7 +204,7 @@ class MyConfigWindow(QDialog):
         lw.takeItem(lw.currentRow())
 
     def on_select_default_lang(self):
-        d = FilterDialog(parent=self, values=list(LANGUAGES_MAP.keys()))
+        d = FilterDialog(parent=self, values=list(lang_map().keys()))
         if d.exec():
             self.dialog.ql_deflang.setText(d.selkey)
 
@@ -242,7 +247,9 @@ class MyConfigWindow(QDialog):
             myfont = ""
         else:
             myfont = self.dialog.lab_Font_selected.text()
-        self.config = {
+        # keep options that can't be set in this dialog
+        self.config = dict(self.config)
+        self.config.update({
             "show pre/code": self.dialog.cb_showPreCode.isChecked(),
             "centerfragments": self.dialog.cb_center.isChecked(),
             "cssclasses": self.dialog.cb_usecss.isChecked(),
@@ -256,5 +263,5 @@ class MyConfigWindow(QDialog):
             "remove leading spaces if possible": self.dialog.cb_remove_leading_spaces.isChecked(),
             "style": self.dialog.lab_style_selected.text(),
             "font": myfont,
-        }
+        })
         QDialog.accept(self)
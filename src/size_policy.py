@@ -0,0 +1,51 @@
+"""
+Limits for huge snippets.
+
+A paste of some ten thousand lines makes a field of many megabytes which makes the
+editor and the reviewer very slow. So before highlighting long code the size of the
+result is estimated (see highlighter.estimate_size) and
+- above "ask before inserting snippets larger than KB" the user is asked,
+- above "insert snippets larger than KB without highlighting" the user is offered to
+  insert the code as plain text in <pre class="shf_pre">,
+- html that is larger than STREAM_ABOVE is passed to the editor in chunks (see
+  highlighter.render_chunks) instead of as one huge string.
+"""
+
+from aqt.utils import askUser
+
+from .config import snapshot
+
+
+ESTIMATE_MIN_CHARS = 10000   # shorter code can't get near the limits
+STREAM_ABOVE = 1024 * 1024   # bytes
+
+HIGHLIGHT = "highlight"
+STREAM = "stream"
+PLAIN = "plain"
+
+
+def describe(code, estimated):
+    return "{} lines, {:,.0f} KB of code, about {:,.0f} KB when highlighted".format(
+        code.count("\n") + 1, len(code.encode("utf-8")) / 1024, estimated / 1024)
+
+
+def decide(code, estimated, inline, parent):
+    """returns HIGHLIGHT, STREAM, PLAIN or None if the user doesn't want to insert the code"""
+    if estimated is None:
+        return HIGHLIGHT
+    conf = snapshot()
+    ask_kb = conf.ask_before_inserting_snippets_larger_than_kb
+    plain_kb = conf.insert_snippets_larger_than_kb_without_highlighting
+    kb = estimated / 1024
+    if kb > plain_kb:
+        msg = ("The highlighted code would be larger than the limit of {:,} KB ({}).\n\n"
+               "Insert it without highlighting?".format(plain_kb, describe(code, estimated)))
+        return PLAIN if askUser(msg, parent=parent, title="Syntax Highlighting") else None
+    if kb > ask_kb:
+        msg = ("The highlighted code is large ({}). Large fields make the editor and the "
+               "reviewer slow.\n\nInsert it anyway?".format(describe(code, estimated)))
+        if not askUser(msg, parent=parent, title="Syntax Highlighting"):
+            return None
+    if estimated > STREAM_ABOVE and not inline:
+        return STREAM
+    return HIGHLIGHT
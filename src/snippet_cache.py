@@ -0,0 +1,109 @@
+"""
+Persistent cache for the html that hilcd inserts into the editor.
+
+Many users insert the same boilerplate snippets over and over. The final html only depends
+on the code, the language and the formatting options so it can be looked up by a hash
+of these. The cache is stored in a sqlite database in the user_files folder so that it
+survives restarts and updates of the add-on. When the database grows larger than
+max_size_mb the least recently used entries are deleted.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import pygments
+
+
+# increase this when the html that hilcd produces for the same options changes
+# 3: the table and code styles are added by the formatter (no more bs4 serialization)
+# 4: inline snippets are written as <span><code> by the formatter
+# 5: the short classes of style_block have the prefix "_"
+CACHE_VERSION = 5
+
+
+def make_cache_key(code, lang_alias, **options):
+    # the pygments version is part of the key because a new version may tokenize differently
+    parts = [CACHE_VERSION, pygments.__version__, lang_alias, sorted(options.items()), code]
+    return hashlib.sha1(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+class SnippetCache:
+    def __init__(self, path, max_size_mb):
+        self.path = path
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.db = None
+        self.total_size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _open(self):
+        if self.db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.db = sqlite3.connect(self.path, isolation_level=None)
+            self.db.execute("""
+                create table if not exists snippets (
+                    key text primary key,
+                    html text not null,
+                    size integer not null,
+                    used real not null
+                )""")
+            self.db.execute("create index if not exists ix_snippets_used on snippets (used)")
+            self.total_size = self.db.execute("select coalesce(sum(size), 0) from snippets").fetchone()[0]
+        return self.db
+
+    def get(self, key):
+        if self.max_size <= 0:
+            return None
+        try:
+            db = self._open()
+            row = db.execute("select html from snippets where key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            db.execute("update snippets set used = ? where key = ?", (time.time(), key))
+        except sqlite3.Error as e:
+            # a broken cache must never prevent highlighting
+            print(f"syntax highlighting: snippet cache not available: {e}")
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, key, html):
+        size = len(html.encode("utf-8"))
+        if size > self.max_size:
+            return
+        try:
+            db = self._open()
+            old = db.execute("select size from snippets where key = ?", (key,)).fetchone()
+            db.execute("insert or replace into snippets values (?, ?, ?, ?)",
+                       (key, html, size, time.time()))
+            self.total_size += size - (old[0] if old else 0)
+            self._evict()
+        except sqlite3.Error as e:
+            print(f"syntax highlighting: snippet cache not available: {e}")
+
+    def _evict(self):
+        if self.total_size <= self.max_size:
+            return
+        to_delete = []
+        freed = 0
+        for key, size in self.db.execute("select key, size from snippets order by used"):
+            to_delete.append((key,))
+            freed += size
+            if self.total_size - freed <= self.max_size:
+                break
+        self.db.executemany("delete from snippets where key = ?", to_delete)
+        self.total_size -= freed
+
+    def set_max_size(self, max_size_mb):
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        if self.db is not None:
+            self._evict()
+
+    def clear(self):
+        db = self._open()
+        db.execute("delete from snippets")
+        self.total_size = 0
@@ -0,0 +1,140 @@
+"""
+Index of the styles that are used in the notes of the collection.
+
+Only the css for styles that are actually used is written to the media folder. Searching
+the collection once for each of the ~40 styles of pygments takes very long for large
+collections so the add-on keeps an index that maps the ids of notes with highlighted
+code to the styles in these notes. It's built with one scan over all notes and then
+kept up to date when notes are saved or deleted. Notes that were changed without these
+hooks (e.g. by a sync) are picked up by their modification time.
+
+The index is stored in the user_files folder, one file per collection.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import re
+
+from anki import hooks
+from anki.hooks import addHook
+from aqt import mw
+
+from .config import user_files_folder
+
+
+style_in_html = re.compile(r"shf__([\w-]+?)__highlight")
+
+_col_path = None
+_notes = {}  # note id -> list of styles
+_last_mod = 0
+_dirty = False
+
+
+def styles_in(html):
+    return sorted(set(style_in_html.findall(html)))
+
+
+def _index_file():
+    name = hashlib.sha1(mw.col.path.encode("utf-8")).hexdigest()
+    return os.path.join(user_files_folder, "styles_in_use", name + ".json")
+
+
+def _full_scan():
+    global _notes, _last_mod, _dirty
+    _notes = {}
+    _last_mod = mw.col.db.scalar("select coalesce(max(mod), 0) from notes")
+    for nid, flds in mw.col.db.execute(r"select id, flds from notes where flds like '%shf\_\_%' escape '\'"):
+        styles = styles_in(flds)
+        if styles:
+            _notes[nid] = styles
+    _dirty = True
+
+
+def _load():
+    global _col_path, _notes, _last_mod, _dirty
+    _col_path = mw.col.path
+    try:
+        with open(_index_file(), encoding="utf-8") as f:
+            content = json.load(f)
+        _notes = {int(nid): styles for nid, styles in content["notes"].items()}
+        _last_mod = content["mod"]
+        _dirty = False
+    except (OSError, ValueError, KeyError):
+        _full_scan()
+
+
+def save():
+    global _dirty
+    if not _dirty or _col_path is None:
+        return
+    path = _index_file()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"mod": _last_mod, "notes": _notes}, f)
+    _dirty = False
+
+
+def _catch_up():
+    """update the index for notes that were changed or deleted behind its back"""
+    global _last_mod, _dirty
+    # mod has a resolution of one second so notes that were changed in the same second
+    # as the last note seen are checked again. _update doesn't change anything for them.
+    for nid, mod, flds in mw.col.db.execute("select id, mod, flds from notes where mod >= ?", _last_mod):
+        _update(nid, flds)
+        _last_mod = max(_last_mod, mod)
+    if _notes:
+        existing = set(mw.col.db.list("select id from notes where id in (%s)" % ",".join(map(str, _notes))))
+        for nid in set(_notes) - existing:
+            del _notes[nid]
+            _dirty = True
+
+
+def _update(nid, html):
+    global _dirty
+    styles = styles_in(html)
+    if _notes.get(nid, []) != styles:
+        if styles:
+            _notes[nid] = styles
+        else:
+            del _notes[nid]
+        _dirty = True
+
+
+def style_counts():
+    """number of notes that use each style"""
+    if mw.col is None:
+        return collections.Counter()
+    if _col_path != mw.col.path:
+        _load()
+    _catch_up()
+    save()
+    return collections.Counter(s for styles in _notes.values() for s in styles)
+
+
+def on_note_will_flush(note):
+    if _col_path is not None and note.id:
+        _update(note.id, note.joinedFields())
+
+
+def on_notes_will_be_deleted(col, ids):
+    global _dirty
+    for nid in ids:
+        if _notes.pop(nid, None) is not None:
+            _dirty = True
+
+
+def on_unload_profile():
+    global _col_path
+    save()
+    _col_path = None
+
+
+# these hooks don't exist in all Anki versions. Changes that aren't noticed by them
+# are found by _catch_up.
+if hasattr(hooks, "note_will_flush"):
+    hooks.note_will_flush.append(on_note_will_flush)
+if hasattr(hooks, "notes_will_be_deleted"):
+    hooks.notes_will_be_deleted.append(on_notes_will_be_deleted)
+addHook("unloadProfile", on_unload_profile)
@@ -4,6 +4,9 @@
 
 import json
 import re
+import time
+
+from .timings import Timing
 
 
 def escape_html_chars(s):
@@ -23,6 +26,13 @@ def wrap_in_tags(editor, selection, tag, class_name=None):
     """
     Wrap selected text in a tag, optionally giving it a class.
     """
+    # see timings.py
+    timing = Timing("wrap in tags", size=len(selection), lang=tag)
+
+    def eval_js(js):
+        with timing.stage("web.eval"):
+            editor.web.eval(js)
+
     selection = escape_html_chars(selection)
     # print("before1:",repr(selection))
     # selection = selection.replace("\n", "<br>")
@@ -43,12 +53,12 @@ def wrap_in_tags(editor, selection, tag, class_name=None):
         # an empty list means trouble, because somehow Anki will also make the
         # line in which we want to put a <code> tag a list if we continue
         replacement = tag_string_begin + selection + tag_string_end
-        editor.web.eval("document.execCommand('insertHTML', false, %s);"
-                        % json.dumps(replacement))
+        eval_js("document.execCommand('insertHTML', false, %s);"
+                % json.dumps(replacement))
 
         editor.web.setFocus()
         field=editor.currentField
-        editor.web.eval("focusField(%d);" % field)
+        eval_js("focusField(%d);" % field)
         def cb():
             html_after = editor.note.fields[field]
 
@@ -69,19 +79,21 @@ def wrap_in_tags(editor, selection, tag, class_name=None):
 
     # first, wrap the selection up in a pattern that the user is unlikely
     # to use in its own cards
-    editor.web.eval("wrap('{0}', '{1}')".format(pattern, pattern[::-1]))
+    eval_js("wrap('{0}', '{1}')".format(pattern, pattern[::-1]))
 
     # focus the field, so that changes are saved
     # this causes the cursor to go to the end of the field
     editor.web.setFocus()
     field = editor.currentField
-    editor.web.eval("focusField(%d);" % field)
+    eval_js("focusField(%d);" % field)
 
     # print("selection:", repr(selection))
     # if tag == "blockquote":
     #     selection = selection.replace("\n", "<br>")
 
     def cb1():
+        timing.add("saveNow", time.perf_counter() - saving)
+        start = time.perf_counter()
         html = editor.note.fields[field]
         begin = html.find(pattern)
         end = html.find(pattern[::-1], begin)
@@ -104,6 +116,7 @@ def wrap_in_tags(editor, selection, tag, class_name=None):
         #     html.replace()
         # delete the current HTML and replace it by our new & improved one
         editor.note.fields[field] = html
+        timing.add("post-processing", time.perf_counter() - start)
 
         # reload the note: this is needed on OS X, because it will otherwise
         # falsely show that the formatting of the element at the start of
@@ -112,10 +125,12 @@ def wrap_in_tags(editor, selection, tag, class_name=None):
 
         # focus the field, so that changes are saved
         editor.web.setFocus()
-        editor.web.eval("focusField(%d);" % field)
+        eval_js("focusField(%d);" % field)
+    saving = time.perf_counter()
     editor.saveNow(cb1)
 
     def cb2():
         editor.web.setFocus()
-        editor.web.eval("focusField(%d);" % field)
+        eval_js("focusField(%d);" % field)
+        timing.finish()
     editor.saveNow(cb2) 
@@ -1,30 +1,35 @@
+import functools
+import hashlib
 import os
 import sys
 import re
 import shutil
+import time
 
 addon_path = os.path.dirname(__file__)
 sys.path.insert(0, os.path.join(addon_path, "libs"))
 
-from bs4 import BeautifulSoup
-from pygments import highlight
-from pygments.lexers import get_lexer_by_name, get_all_lexers
-from pygments.formatters import HtmlFormatter
-from pygments.util import ClassNotFound
-from pygments.styles import get_all_styles
-
 import aqt
 from aqt.qt import *
 from aqt import mw
 from aqt.editor import Editor
-from aqt.utils import showWarning, showInfo
+from aqt.utils import showWarning, showInfo, tooltip
 from anki.utils import json
 from anki.hooks import addHook, wrap
 
-from .config import gc
-from .fuzzy_panel import FilterDialog
-from .settings import MyConfigWindow
+# Only what's needed to register the hooks is imported when Anki starts. pygments, bs4,
+# the dialogs and the background threads are imported in the functions that use them,
+# i.e. when the user highlights code or opens the settings for the first time. See
+# benchmarks/import_time.py
+from .config import config_changed_callbacks, on_config_changed, snapshot, user_files_folder
+from .deck_languages import deck_language, note_type_language
+from .languages import lang_map, usual_aliases
+from .styles_in_use import style_counts
+from . import prewarm
+from . import size_policy
+from .size_policy import ESTIMATE_MIN_CHARS
 from .supplementary import wrap_in_tags
+from .timings import Timing
 
 
 ############################################
@@ -60,17 +65,63 @@ function MyInsertHtml(content) {
     s.removeAllRanges();
     s.addRange(r);
 }
+// huge snippets are sent in chunks, see highlight_job.py
+var shfChunks = {};
+function shfAddChunk(job, chunk) {
+    (shfChunks[job] = shfChunks[job] || []).push(chunk);
+}
+function shfInsertChunks(job, noclasses) {
+    var content = (shfChunks[job] || []).join("");
+    delete shfChunks[job];
+    if (noclasses) {
+        MyInsertHtml(content);
+    } else {
+        setFormat("inserthtml", content);
+    }
+}
+function shfDropChunks(job) {
+    delete shfChunks[job];
+}
+// the css for the styles in the current note, see editor_css.py
+function shfMissingStyles(versions) {
+    return Object.keys(versions).filter(function (name) {
+        var el = document.getElementById("shf-css-" + name);
+        return !el || el.dataset.version !== versions[name];
+    });
+}
+function shfAddStyles(fragments) {
+    for (var name in fragments) {
+        var el = document.getElementById("shf-css-" + name);
+        if (!el) {
+            el = document.createElement("style");
+            el.id = "shf-css-" + name;
+            document.head.appendChild(el);
+        }
+        el.dataset.version = fragments[name][0];
+        el.textContent = fragments[name][1];
+    }
+}
 </script>
 """
 
+editor_html_patched = False
+
+
 def profileLoaded():
-    editor_style = ""
-    if os.path.isfile(css_file_in_media):
-        with open(css_file_in_media, "r") as css_file:
-            css = css_file.read()
-            editor_style = "<style>\n{}\n</style>".format(css.replace("%", "%%"))
-    aqt.editor._html = editor_style + insertscript + aqt.editor._html
+    # the css is loaded per note, see editor_css.py
+    global editor_html_patched
+    if not editor_html_patched:
+        aqt.editor._html = insertscript + aqt.editor._html
+        editor_html_patched = True
 addHook("profileLoaded", profileLoaded)
+addHook("profileLoaded", lambda: prewarm.start(prewarm_steps))
+
+
+def on_load_note(editor):
+    # editor_css.py is imported when the first note is loaded, not at startup
+    from .editor_css import on_load_note
+    on_load_note(editor)
+addHook("loadNote", on_load_note)
 
 
 def update_templates(templatenames):
@@ -91,11 +142,10 @@ def update_templates(templatenames):
 
 
 def styles_that_need_css():
-    styles_to_set = []
-    for s in get_all_styles():
-        if mw.col.find_cards(f"shf__{s}__highlight"):
-            styles_to_set.append(s)
-    return styles_to_set
+    from pygments.styles import get_all_styles
+    # see styles_in_use.py
+    in_use = style_counts()
+    return [s for s in get_all_styles() if in_use[s]]
 
 
 # font_for_line_numbers
@@ -111,10 +161,15 @@ css_to_set_font_for_line_numbers = """
 
 
 def css_for_style(style, also_default_highlight_class=False):
+    return _css_for_style(style, snapshot().font, also_default_highlight_class)
+
+
+# the templates don't change while Anki is running
+@functools.lru_cache(maxsize=None)
+def _css_for_style(style, font, also_default_highlight_class):
     template_file = os.path.join(css_templates_folder, style + ".css")
     with open(template_file) as f:
         css = f.read()
-    font = gc("font", "Droid Sans Mono")
     withfonts = css % (font, font, font)
     withstyles = withfonts.replace(".highlight", f".shf__{style}__highlight")
     line_number_fix = css_to_set_font_for_line_numbers.format(style=style, font=font)
@@ -125,43 +180,84 @@ def css_for_style(style, also_default_highlight_class=False):
 
 
 def update_cssfile_in_mediafolder(style):
-    css = css_for_style(style, True)
-    also_include = styles_that_need_css()
-    if style in also_include:
-        also_include.remove(style)
-    for s in also_include:
-        css += "\n\n\n\n\n" + css_for_style(s)
-    with open(css_file_in_media, "w") as f:
-        f.write(css)
+    """returns the size of the css in bytes before and after optimize_css"""
+    from .css_optimizer import optimize_css
+    timing = Timing("css file", lang=style)
+    with timing.stage("styles in use"):
+        also_include = styles_that_need_css()
+    with timing.stage("css templates"):
+        css = css_for_style(style, True)
+        if style in also_include:
+            also_include.remove(style)
+        for s in also_include:
+            css += "\n\n\n\n\n" + css_for_style(s)
+    with timing.stage("optimize"):
+        content = optimize_css(css).encode("utf-8")
+    sizes = (len(css.encode("utf-8")), len(content))
+    timing.info.update(size=sizes[0], options={"styles": len(also_include) + 1, "optimized size": sizes[1]})
+    # Anki syncs every changed file in the media folder so I only write the file if
+    # the content is different.
+    with timing.stage("write"):
+        try:
+            with open(css_file_in_media, "rb") as f:
+                unchanged = hashlib.sha1(f.read()).digest() == hashlib.sha1(content).digest()
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            # write to a temporary file first so that the file in the media folder is never incomplete
+            tmp_file = css_file_in_media + ".tmp"
+            with open(tmp_file, "wb") as f:
+                f.write(content)
+            os.replace(tmp_file, css_file_in_media)
+    timing.finish(written=not unchanged)
+    return sizes
 
 
 def onMySettings():
+    from .settings import MyConfigWindow
     dialog = MyConfigWindow(mw, mw.addonManager.getConfig(__name__))
     dialog.activateWindow()
     dialog.raise_()
     if dialog.exec_():
         mw.addonManager.writeConfig(__name__, dialog.config)
+        on_config_changed()
         mw.progress.start(immediate=True)
         if hasattr(dialog, "templates_to_update"):
             update_templates(dialog.templates_to_update)
-        update_cssfile_in_mediafolder(dialog.config["style"])
+        before, after = update_cssfile_in_mediafolder(dialog.config["style"])
         mw.progress.finish()
-        showInfo("You need to restart Anki so that all changes take effect.")
+        msg = "You need to restart Anki so that all changes take effect."
+        if dialog.config["cssclasses"]:
+            msg += (f"\n\nThe file '_styles_for_syntax_highlighting.css' in your media folder "
+                    f"has {after / 1024:.1f} KB ({before / 1024:.1f} KB before optimization).")
+        showInfo(msg)
 mw.addonManager.setConfigAction(__name__, onMySettings)
 
 
-#######END gui config and auto loading #####
-############################################
+_snippet_cache = None
 
 
+def get_snippet_cache():
+    global _snippet_cache
+    if _snippet_cache is None:
+        from .snippet_cache import SnippetCache
+        _snippet_cache = SnippetCache(os.path.join(user_files_folder, "snippet_cache.sqlite"),
+                                      snapshot().snippet_cache_size_in_mb)
+    return _snippet_cache
+
+
+def on_settings_changed():
+    from .highlighter import clear_caches
+    clear_caches()
+    if _snippet_cache is not None:
+        _snippet_cache.set_max_size(snapshot().snippet_cache_size_in_mb)
+config_changed_callbacks.append(on_settings_changed)
+
+
+#######END gui config and auto loading #####
+############################################
 
 
-# This code sets a correspondence between:
-#  The "language names": long, descriptive names we want
-#                        to show the user AND
-#  The "language aliases": short, cryptic names for internal
-#                          use by HtmlFormatter
-LANG_MAP = {lex[0]: lex[1][0] for lex in get_all_lexers()}
 
 ERR_LEXER = ("<b>Error</b>: Selected language not found.<br>"
              "A common source of errors: When you update the add-on Anki keeps your user settings"
@@ -182,22 +278,24 @@ def showError(msg, parent):
     showWarning(msg, title="Code Formatter Error", parent=parent)
 
 
-def get_deck_name(editor):
+def get_deck_id(editor):
     if isinstance(editor.parentWindow, aqt.addcards.AddCards):
-        return editor.parentWindow.deckChooser.deckName()
+        return editor.parentWindow.deckChooser.selectedId()
     elif isinstance(editor.parentWindow, (aqt.browser.Browser, aqt.editcurrent.EditCurrent)):
-        return mw.col.decks.name(editor.card.did)
+        return editor.card.did if editor.card else None
     else:
         return None  # Error
 
 
 def get_default_lang(editor):
-    lang = gc('defaultlang')
-    if gc('defaultlangperdeck'):
-        deck_name = get_deck_name(editor)
-        if deck_name and deck_name in gc('deckdefaultlang'):
-            lang = gc('deckdefaultlang')[deck_name]
-    return lang
+    # see deck_languages.py
+    lang = note_type_language(editor.note, editor.currentField)
+    if lang:
+        return lang
+    conf = snapshot()
+    if conf.defaultlangperdeck:
+        lang = deck_language(get_deck_id(editor))
+    return lang or conf.defaultlang
 
 
 def process_html(html):
@@ -208,35 +306,147 @@ def process_html(html):
     return html
 
 
+def snippet_formatter_options(conf, style, linenos, centerfragments, noclasses, inline):
+    """
+    the arguments of get_formatter for hilcd, prewarm_steps uses them to build the formatter
+    that hilcd will get from the cache of get_formatter.
+    """
+    from .highlighter import css_class_for
+    return dict(
+        style=style,
+        linenos=linenos,
+        cssclass=css_class_for(style, conf.cssclasses, conf.css_custom_class_per_style),
+        cssstyles="text-align: left;" if noclasses else "",
+        noclasses=noclasses,
+        centerfragments=centerfragments,
+        font=conf.font,
+        inline=inline,
+        compact=conf.compact_html,
+        # only used if cssclasses is off, see SnippetFormatter in highlighter.py
+        style_block=noclasses and conf.style_block_instead_of_inline_styles)
+
+
+def prewarm_steps():
+    """
+    loads what the first hilcd of the session probably needs, runs in the thread of
+    prewarm.py and yields after each step: the modules that hilcd and the helper menu
+    import, the formatter for the settings (without modifier keys) and the lexers of the
+    default language, the favorites and the deck default languages.
+    """
+    # only imported so that hilcd finds them in sys.modules
+    import pygments.styles  # noqa: F401
+    from . import fuzzy_panel, highlight_job, language_detection, snippet_cache  # noqa: F401
+    from .highlighter import get_formatter, get_lexer
+    yield
+    conf = snapshot()
+    get_formatter(**snippet_formatter_options(conf, conf.style, conf.linenos, conf.centerfragments,
+                                              not conf.cssclasses, False))
+    yield
+    for alias in usual_aliases():
+        get_lexer(alias, stripall=not conf.remove_leading_spaces_if_possible)
+        yield
+
+
 def hilcd(ed, code, langAlias):
+    from pygments.styles import get_all_styles
+    from pygments.util import ClassNotFound
+    from .editor_css import load_styles, names_in_html
+    from .fuzzy_panel import FilterDialog
+    from .highlighter import (CHUNK_SIZE, estimate_size, get_formatter, get_lexer, render_chunks,
+                              render_snippet)
+    from .highlight_job import BACKGROUND_MIN_CHARS, run_in_background
+    from .snippet_cache import make_cache_key
     global LASTUSED
-    linenos = gc('linenos')
-    centerfragments = gc('centerfragments')
-    noclasses = not gc('cssclasses')
+    # the lexers and the formatter are loaded now, see prewarm.py
+    prewarm.stop()
+    # see timings.py and diagnostics.py
+    timing = Timing("hilcd", size=len(code), lang=langAlias)
+    conf = snapshot()
+    linenos = conf.linenos
+    centerfragments = conf.centerfragments
+    noclasses = not conf.cssclasses
     if (ed.mw.app.keyboardModifiers() & Qt.ShiftModifier):
         linenos ^= True
     if (ed.mw.app.keyboardModifiers() & Qt.ControlModifier):
         centerfragments ^= True
-    mystyle = gc("style")
+    mystyle = conf.style
     if (ed.mw.app.keyboardModifiers() & Qt.AltModifier):
         d = FilterDialog(parent=None, values=list(get_all_styles()))
-        if d.exec():
-            mystyle = d.selkey
+        with timing.excluded():
+            if d.exec():
+                mystyle = d.selkey
         noclasses = True
     inline = False
     if (ed.mw.app.keyboardModifiers() & Qt.MetaModifier):
         inline = True
     if inline:
         linenos = False
+    stripall = not conf.remove_leading_spaces_if_possible
+    formatter_options = snippet_formatter_options(conf, mystyle, linenos, centerfragments, noclasses, inline)
+    css_class = formatter_options["cssclass"]
+    compact = formatter_options["compact"]
+    style_block = formatter_options["style_block"]
+    timing.info["options"] = dict(style=mystyle, linenos=linenos, centerfragments=centerfragments,
+                                  noclasses=noclasses, inline=inline, compact=compact,
+                                  style_block=style_block, font=conf.font, stripall=stripall)
+
+    # snippets that were highlighted with the same options before (maybe in an earlier
+    # session) are not highlighted again
+    cache_key = make_cache_key(code, langAlias, style=mystyle, linenos=linenos, inline=inline,
+                               centerfragments=centerfragments, noclasses=noclasses,
+                               css_class=css_class, font=conf.font, stripall=stripall,
+                               compact=compact, style_block=style_block)
+
+    def decided(estimated):
+        """the decision of size_policy.py, None if there's nothing more to do"""
+        # the user may be asked
+        with timing.excluded():
+            decision = size_policy.decide(code, estimated, inline, ed.parentWindow)
+        if decision is None:
+            timing.discard()
+        elif decision == size_policy.PLAIN:
+            timing.finish(path="plain")
+            wrap_in_tags(ed, code, tag="pre", class_name="shf_pre")
+            return None
+        return decision
+
+    def insert_chunks(first_chunk, job):
+        global LASTUSED
+        with timing.stage("web.eval"):
+            if not noclasses:
+                load_styles(ed, names_in_html(first_chunk))
+            ed.web.eval("shfInsertChunks(%d, %s);" % (job, json.dumps(noclasses)))
+        LASTUSED = langAlias
+        timing.finish(path="chunks")
+
+    snippet_cache = get_snippet_cache()
+    with timing.stage("cache lookup"):
+        pretty_code = snippet_cache.get(cache_key)
+    if pretty_code is not None:
+        # the size of a cached snippet is known, it's treated like a new one of this size
+        estimated = len(pretty_code.encode("utf-8"))
+        decision = decided(estimated)
+        if decision == size_policy.STREAM:
+            def cached_chunks(cancelled, emit):
+                for start in range(0, len(pretty_code), CHUNK_SIZE):
+                    emit(pretty_code[start:start + CHUNK_SIZE])
+                return pretty_code[:CHUNK_SIZE]
+            run_in_background(ed, cached_chunks, lambda first_chunk: None, insert_chunks,
+                              label=size_policy.describe(code, estimated), chunked=True, timing=timing)
+        elif decision is not None:
+            with timing.stage("web.eval"):
+                insert_snippet(ed, pretty_code, noclasses)
+            LASTUSED = langAlias
+            timing.finish(path="cache")
+        return
 
     try:
-        if gc("remove leading spaces if possible", True):
-            my_lexer = get_lexer_by_name(langAlias, stripall=False)
-        else:
-            my_lexer = get_lexer_by_name(langAlias, stripall=True)
+        with timing.stage("lexer lookup"):
+            my_lexer = get_lexer(langAlias, stripall=stripall)
     except ClassNotFound as e:
         print(e)
         print(ERR_LEXER)
+        timing.discard()
         showError(ERR_LEXER, parent=ed.parentWindow)
         return False
 
@@ -321,107 +531,69 @@ filename
 wrapcode
     Wrap the code inside <pre> blocks using <code>, as recommended by the HTML5 specification.
         """
-        tablestyling = ""
-        if noclasses:
-            tablestyling += "text-align: left;"
-        if gc("cssclasses") and not gc("css_custom_class_per_style"):
-            css_class = "highlight"  # the default for pygments
-        else:
-            css_class = f"shf__{mystyle}__highlight"
-        my_formatter = HtmlFormatter(
-            cssclass=css_class,
-            cssstyles=tablestyling,
-            font_size=16,
-            linenos=linenos, 
-            lineseparator="<br>",
-            nobackground=False,  # True would solve night mode problem without any config (as long as no line numbers are used)
-            noclasses=noclasses,
-            style=mystyle,
-            wrapcode=True)
+        # reuses the formatter if the same options were used before, see highlighter.py
+        with timing.stage("formatter lookup"):
+            my_formatter = get_formatter(**formatter_options)
     except ClassNotFound as e:
         print(e)
         print(ERR_STYLE)
+        timing.discard()
         showError(ERR_STYLE, parent=ed.parentWindow)
         return False
 
-    pygmntd = highlight(code, my_lexer, my_formatter).rstrip()
-    # when using noclasses/inline styling pygments adds line-height 125%, see
-    # see https://github.com/pygments/pygments/blob/2fe2152377e317fd215776b6d7467bda3e8cda28/pygments/formatters/html.py#L269
-    # It's seems to be only relevant for IE and makes the line numbers misaligned on my PC. So I remove it.
-    if noclasses:
-        pygmntd = pygmntd.replace('line-height: 125%;', '')
-    if inline:
-        pretty_code = "".join([pygmntd, "<br>"])
-        replacements = {
-            '<div class=': '<span class=',
-            "<pre": "<code",
-            "</pre></div>": "</code></span>",
-            "<br>": "",
-            "</br>": "",
-            "</ br>": "",
-            "<br />": "",
-            'style="line-height: 125%"': '',
-        }
-        for k, v in replacements.items():
-            pretty_code = pretty_code.replace(k, v)
+    # huge snippets make the editor and the reviewer slow, see size_policy.py
+    estimated = None
+    if len(code) >= ESTIMATE_MIN_CHARS:
+        with timing.stage("size estimate"):
+            estimated = estimate_size(code, my_lexer, my_formatter)
+    decision = decided(estimated)
+    if decision is None:
+        return
+
+    options = dict(linenos=linenos, centerfragments=centerfragments, noclasses=noclasses,
+                   css_class=css_class)
+
+    def store(pretty_code):
+        with timing.stage("cache store"):
+            snippet_cache.put(cache_key, pretty_code)
+
+    def insert(pretty_code, path):
+        global LASTUSED
+        with timing.stage("web.eval"):
+            insert_snippet(ed, pretty_code, noclasses)
+        LASTUSED = langAlias
+        timing.finish(path=path)
+
+    if decision == size_policy.STREAM:
+        def render_in_chunks(cancelled, emit):
+            first = []
+
+            def emit_and_remember(chunk):
+                if not first:
+                    first.append(chunk)
+                emit(chunk)
+            render_chunks(code, my_lexer, my_formatter, emit_and_remember, cancelled=cancelled,
+                          timing=timing, **options)
+            return first[0]
+
+        # the snippet cache isn't meant for snippets of this size
+        run_in_background(ed, render_in_chunks, lambda first_chunk: None, insert_chunks,
+                          label=size_policy.describe(code, estimated), chunked=True, timing=timing)
+    elif len(code) < BACKGROUND_MIN_CHARS:
+        pretty_code = render_snippet(code, my_lexer, my_formatter, inline=inline, timing=timing, **options)
+        store(pretty_code)
+        insert(pretty_code, "main thread")
     else:
-        if linenos:
-            pretty_code = "".join([pygmntd, "<br>"])
-        # to show line numbers pygments uses a table. The background color for the code
-        # highlighting is limited to this table
-        # If pygments doesn't use linenumbers it doesn't use a table. This means
-        # that the background color covers the whole width of the card.
-        # I don't like this. I didn't find an easier way than reusing the existing
-        # solution.
-        # Glutanimate removed the table in the commit
-        # https://github.com/glutanimate/syntax-highlighting/commit/afbf5b3792611ecd2207b9975309d05de3610d45
-        # which hasn't been published on Ankiweb in 2019-10-02.
-        else:
-            pretty_code = "".join([f'<table class="{css_class}table"><tbody><tr><td>',
-                                    pygmntd,
-                                    "</td></tr></tbody></table><br>"])
-        """
-        I can't solely rely on the pygments-HTMLFormatter
-        A lot of the stuff I did before 2020-11 with bs4 can indeed be done by adjusting
-        the HTMLFormatter options:
-        - I can override the ".card {text-align: center}" by using the option "cssstyles"
-          (Inline CSS styles for the wrapping <div> tag).
-        - I can set a custom class by adjusting the option "cssclass" which defaults to "highlight"
-          Besides this there are the classes linenos and linenodiv. BUT I don't need to customize 
-          the latter classes. I can also work with longer css rules: 
-             /*syntax highlighting fork add-on: dark background*/
-             .night_mode .shf__default__highlight{
-             background-color: #222222 !important;
-             }
-             /*syntax highlighting fork add-on: line numbers: white on black: sometimes a span is used, sometimes not*/
-             .night_mode .shf__default__highlighttable tr td.linenos div.linenodiv pre span {
-             background-color: #222222 !important;
-             color: #f0f0f0 !important;
-             }
-             .night_mode .shf__default__highlighttable tr td.linenos div.linenodiv pre {
-             background-color: #222222 !important;
-             color: #f0f0f0 !important;
-             }
-        BUT as far as I see I can't set inline styling for the surrounding table. But to center the
-        table I need to add something like "margin: 0 auto;". If you rely on css it's easy because
-        the "the wrapping table will have a CSS class of [the cssclass] string plus 'table', the 
-        default is accordingly 'highlighttable'.". But my option should work without the user
-        adjusting each template and the editor.
-        I also need to set the font.
-        """
-        if centerfragments or (noclasses and gc('font')):
-            soup = BeautifulSoup(pretty_code, 'html.parser')
-            if centerfragments:
-                tablestyling = "margin: 0 auto;"
-                for t in soup.findAll("table"):
-                    if t.has_attr('style'):
-                        t['style'] = tablestyling + t['style']
-                    else:
-                        t['style'] = tablestyling
-            if noclasses and gc('font'):
-                for t in soup.findAll("code"):
-                    t['style'] = "font-family: %s;" % gc('font')
-            pretty_code = str(soup)
+        # long snippets would freeze the editor for seconds, see highlight_job.py
+        def render(cancelled):
+            return render_snippet(code, my_lexer, my_formatter, inline=inline, cancelled=cancelled,
+                                  timing=timing, **options)
+        label = size_policy.describe(code, estimated) if estimated is not None else ""
+        run_in_background(ed, render, store, lambda pretty_code: insert(pretty_code, "background"),
+                          label=label)
+
+
+def insert_snippet(ed, pretty_code, noclasses):
     if noclasses:
         out = json.dumps(pretty_code).replace('\n', ' ').replace('\r', '')
         # In 2020-05 I don't remember why I used backticks/template literals 
@@ -434,9 +606,11 @@ wrapcode
         # out = "`" + json.dumps(pretty_code)[1:-1] + "`"
         ed.web.eval("MyInsertHtml(%s);" % out)
     else:
+        # the editor only has the css for the styles of the current note, see editor_css.py
+        from .editor_css import load_styles, names_in_html
+        load_styles(ed, names_in_html(pretty_code))
         # setFormat is a thin wrapper in Anki around document.execCommand
         ed.web.eval("setFormat('inserthtml', %s);" % json.dumps(pretty_code))
-    LASTUSED = langAlias
 
 
 basic_stylesheet = """
@@ -485,7 +659,8 @@ def alternative_keys(self, key):
 
 
 def onAll(editor, code):
-    d = FilterDialog(editor.parentWindow, LANG_MAP)
+    from .fuzzy_panel import FilterDialog
+    d = FilterDialog(editor.parentWindow, lang_map())
     if d.exec():
         hilcd(editor, code, d.selvalue)
 
@@ -518,10 +693,10 @@ def remove_leading_spaces(code):
                 starting_space = s
 
     # if we found a minimum number of chars we can strip off each line, do it.
+    # join instead of adding to a string: that copies the whole string for every line
+    # and took seconds for pastes with tens of thousands of lines
     if (starting_space < sys.maxsize):
-        code = '';    
-        for l in lines:
-            code = code + l[starting_space:] + '\n'
+        code = ''.join([l[starting_space:] + '\n' for l in lines])
     return code
 
 
@@ -580,11 +755,14 @@ At the moment my version of the MiniFormatSupplementary mostly works so I keep i
 '''
 
 
-def _openHelperMenu(editor, code, selected_text):
-    global LASTUSED
+def _openHelperMenu(editor, code, selected_text, timing=None):
+    if timing is None:
+        timing = Timing("helper menu", size=len(code))
+    conf = snapshot()
 
-    if gc("remove leading spaces if possible", True):
-        code = remove_leading_spaces(code)
+    if conf.remove_leading_spaces_if_possible:
+        with timing.stage("remove leading spaces"):
+            code = remove_leading_spaces(code)
 
     menu = QMenu(editor.widget)
     menu.setStyleSheet(basic_stylesheet)
@@ -598,7 +776,7 @@ def _openHelperMenu(editor, code, selected_text):
     kfilter = keyFilter(menu)
     menu.installEventFilter(kfilter)
 
-    if gc("show pre/code", False):
+    if conf.show_pre_code:
         # TODO: Do I really need the custom code, couldn't I just wrap in newer versions
         # as with the mini format pack, see https://github.com/glutanimate/mini-format-pack/pull/13/commits/725bb8595631e4dbc56bf881427aeada848e43c9
         m_pre = menu.addAction("&unformatted (<pre>)")
@@ -606,10 +784,11 @@ def _openHelperMenu(editor, code, selected_text):
         m_cod = menu.addAction("unformatted (<&code>)")
         m_cod.triggered.connect(lambda _, a=editor, c=code: wrap_in_tags(a, c, tag="code", class_name="shf_code"))
 
+    langs = lang_map()
     defla = get_default_lang(editor)
-    if defla in LANG_MAP:
+    if defla in langs:
         d = menu.addAction("&default (%s)" % defla)
-        d.triggered.connect(lambda _, a=editor, c=code: hilcd(a, c, LANG_MAP[defla]))
+        d.triggered.connect(lambda _, a=editor, c=code: hilcd(a, c, langs[defla]))
     else:
         d = False
         illegal_info(defla)
@@ -619,6 +798,12 @@ def _openHelperMenu(editor, code, selected_text):
         l = menu.addAction("l&ast used")
         l.triggered.connect(lambda _, a=editor, c=code: hilcd(a, c, LASTUSED))
 
+    # the detection only runs when the entry is hovered or chosen, see detect_language
+    t = menu.addAction("de&tect")
+    candidates = list(dict.fromkeys(usual_aliases(defla) + ([LASTUSED] if LASTUSED else [])))
+    t.hovered.connect(lambda c=code, t=t: detect_language(c, candidates, t))
+    t.triggered.connect(lambda _, a=editor, c=code, t=t: on_detect(a, c, candidates, t))
+
     favmenu = menu.addMenu('&favorites')
     favfilter = keyFilter(favmenu)
     favmenu.installEventFilter(favfilter)
@@ -626,19 +811,43 @@ def _openHelperMenu(editor, code, selected_text):
 
     a = menu.addAction("&select from all")
     a.triggered.connect(lambda _, a=editor, c=code: onAll(a, c))
-    for e in gc("favorites"):
-        if e in LANG_MAP:
+    for e in conf.favorites:
+        if e in langs:
             a = favmenu.addAction(e)
-            a.triggered.connect(lambda _, a=editor, c=code, l=LANG_MAP[e]: hilcd(a, c, l))
+            a.triggered.connect(lambda _, a=editor, c=code, l=langs[e]: hilcd(a, c, l))
         else:
             illegal_info(e)
             return
 
     if d:
         menu.setActiveAction(d)
+    # the time until the user picks an entry doesn't count
+    timing.finish(options={"selection": bool(selected_text)})
     menu.exec_(QCursor.pos())
 
 
+def detect_language(code, candidates, action):
+    """shows the detected language in the text of action, the result is cached by detect"""
+    from .language_detection import detect
+    timing = Timing("language detection", size=len(code))
+    detected = detect(code, candidates)
+    timing.finish(lang=detected.alias if detected else None)
+    if detected:
+        action.setText("de&tect (%s, %d%%)" % (detected.name, round(detected.confidence * 100)))
+        action.setToolTip("detected by %s" % detected.method)
+    else:
+        action.setText("de&tect (no guess)")
+    return detected
+
+
+def on_detect(editor, code, candidates, action):
+    detected = detect_language(code, candidates, action)
+    if detected:
+        hilcd(editor, code, detected.alias)
+    else:
+        tooltip("The language of the code couldn't be detected.", parent=editor.widget)
+
+
 def openHelperMenu(editor):
     selected_text = editor.web.selectedText()
     if selected_text:
@@ -646,8 +855,13 @@ def openHelperMenu(editor):
         # '\u00A0' (non-breaking space). This character messes with the
         # formatter for highlighted code.
         code = selected_text.replace('\u00A0', ' ')
-        editor.web.evalWithCallback("document.execCommand('delete');", lambda 
-                                    _, e=editor, c=code: _openHelperMenu(e, c, True))
+        timing = Timing("helper menu", size=len(code))
+        start = time.perf_counter()
+
+        def deleted(_):
+            timing.add("web.eval", time.perf_counter() - start)
+            _openHelperMenu(editor, code, True, timing)
+        editor.web.evalWithCallback("document.execCommand('delete');", deleted)
     else:
         clipboard = QApplication.clipboard()
         code = clipboard.text()
@@ -662,7 +876,7 @@ addHook('EditorWebView.contextMenuEvent', editorContextMenu)
 
 
 # def SetupShortcuts(cuts, editor):
-#     cuts.append((gc("hotkey"), lambda e=editor: openHelperMenu(e)))
+#     cuts.append((snapshot().hotkey, lambda e=editor: openHelperMenu(e)))
 # addHook("setupEditorShortcuts", SetupShortcuts)
 
 
@@ -676,8 +890,8 @@ def setupEditorButtonsFilter(buttons, editor):
         os.path.join(addon_path, "icons", "button.png"),
         "syhl_linkbutton",
         openHelperMenu,
-        tip="Syntax Highlighting for code ({})".format(keystr(gc("hotkey", ""))),
-        keys=gc("hotkey", "")
+        tip="Syntax Highlighting for code ({})".format(keystr(snapshot().hotkey)),
+        keys=snapshot().hotkey
         )
     buttons.append(b)
     return buttons
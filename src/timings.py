@@ -0,0 +1,154 @@
+"""
+Timings of what the add-on does in the editor so that slow highlighting can be tracked down.
+
+hilcd, the helper menu, wrap_in_tags and the update of the css file in the media folder
+create a Timing and add up the time of their stages (e.g. "lexer lookup", "tokenize",
+"format", "post-processing", "web.eval", "saveNow"). When the action is finished the
+Timing is stored in a ring buffer with the size of the input, the language and the
+options. The last BUFFER_SIZE actions of the session are kept, see diagnostics.py for the
+dialog that shows them.
+
+A Timing only calls time.perf_counter() at the start and end of each stage. The lexer
+and the formatter take turns for every token so the time of the lexer is estimated from
+every TOKEN_SAMPLE-th token. Timing every token made the highlighting 16% slower, with
+the samples it's about 2% and for most files in benchmarks/corpus the estimate is within
+10% of the time that the lexer needs on its own.
+
+Actions that are cancelled or fail aren't recorded, they call Timing.discard(). Time in which the add-on waits for the
+user (e.g. a dialog) is excluded with Timing.excluded().
+"""
+
+import collections
+import itertools
+import json
+import math
+import sys
+import time
+from contextlib import contextmanager
+
+import pygments
+
+
+BUFFER_SIZE = 500
+PERCENTILES = (0.5, 0.9, 0.99)
+TOKEN_SAMPLE = 64
+
+# appending to a deque is thread-safe
+records = collections.deque(maxlen=BUFFER_SIZE)
+
+
+class Timing:
+    def __init__(self, action, **info):
+        self.action = action
+        self.info = info
+        self.stages = {}  # name: seconds
+        self.time = time.time()
+        self.start = time.perf_counter()
+        self.finished = False
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    @contextmanager
+    def excluded(self):
+        """the time in this block doesn't count for the total"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.start += time.perf_counter() - start
+
+    def timed_tokens(self, tokens, stage="tokenize"):
+        """passes the tokens on, the estimated time it takes to make them is added to stage"""
+        clock = time.perf_counter
+        tokens = iter(tokens)
+        first = sampled = 0.0
+        try:
+            # the first token also includes the setup of the lexer
+            start = clock()
+            try:
+                token = next(tokens)
+            except StopIteration:
+                return
+            finally:
+                first = clock() - start
+            yield token
+            while True:
+                yield from itertools.islice(tokens, TOKEN_SAMPLE - 1)
+                start = clock()
+                try:
+                    token = next(tokens)
+                except StopIteration:
+                    return
+                finally:
+                    sampled += clock() - start
+                yield token
+        finally:
+            self.add(stage, first + sampled * TOKEN_SAMPLE)
+
+    def finish(self, **info):
+        """stores the timing in the ring buffer, only the first call counts"""
+        if self.finished:
+            return
+        self.finished = True
+        self.info.update(info)
+        record = {
+            "action": self.action,
+            "time": round(self.time, 3),
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            "stages_ms": {name: round(s * 1000, 3) for name, s in self.stages.items()},
+        }
+        record.update(self.info)
+        records.append(record)
+
+    def discard(self):
+        """for actions that were cancelled or failed, a later finish() doesn't store it"""
+        self.finished = True
+
+
+def percentile(sorted_values, q):
+    # nearest rank like in benchmarks/addon_suite.py
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+def summary():
+    """
+    {(action, stage): {"n": .., "p50": .., "p90": .., "p99": .., "max": ..}} in ms for
+    the records in the buffer, the stage "total" is the whole action
+    """
+    values = {}
+    for record in list(records):
+        action = record["action"]
+        values.setdefault((action, "total"), []).append(record["total_ms"])
+        for stage, ms in record["stages_ms"].items():
+            values.setdefault((action, stage), []).append(ms)
+    result = {}
+    for key, ms in sorted(values.items()):
+        ms.sort()
+        stats = {"n": len(ms)}
+        for q in PERCENTILES:
+            stats[f"p{round(q * 100)}"] = percentile(ms, q)
+        stats["max"] = ms[-1]
+        result[key] = stats
+    return result
+
+
+def export(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "python": sys.version.split()[0],
+            "pygments": pygments.__version__,
+            "records": list(records),
+        }, f, indent=1)
+
+
+def clear():
+    records.clear()
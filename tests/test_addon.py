@@ -0,0 +1,71 @@
+"""
+tests of the parts of the add-on that need aqt, with the stand-ins from
+benchmarks/standins.py (see benchmarks/addon_suite.py)
+"""
+
+import importlib
+import json
+import os
+import sys
+
+import pytest
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks")
+sys.path.insert(0, BENCHMARKS)
+
+from addon_suite import PACKAGE, SRC, load_addon  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def mw(tmp_path_factory):
+    with open(os.path.join(SRC, "config.json"), encoding="utf-8") as f:
+        config = json.load(f)
+    return load_addon(str(tmp_path_factory.mktemp("addon")), config)
+
+
+def addon_module(name):
+    return importlib.import_module(f"{PACKAGE}.{name}")
+
+
+def set_config(mw, **changes):
+    conf = mw.addonManager.getConfig(PACKAGE)
+    conf.update(changes)
+    mw.addonManager.writeConfig(PACKAGE, conf)
+    addon_module("config").on_config_changed()
+
+
+def test_subdecks_get_the_language_of_their_parent(mw):
+    dl = addon_module("deck_languages")
+    cs, py, aio, other = (mw.col.decks.id(n) for n in ("CS", "CS::Python", "CS::Python::Async", "Other"))
+    set_config(mw, deckdefaultlang={"CS": "C", "CS::Python": "Python"})
+    assert dl.deck_language(cs) == "C"
+    assert dl.deck_language(py) == "Python"
+    assert dl.deck_language(aio) == "Python"
+    assert dl.deck_language(other) is None
+    # a new deck is in the map, too
+    assert dl.deck_language(mw.col.decks.id("CS::Rust")) == "C"
+
+
+def test_renamed_decks_keep_their_language(mw):
+    dl = addon_module("deck_languages")
+    async_ = mw.col.decks.id("Lang::Python::Async")
+    set_config(mw, deckdefaultlang={"Lang::Python": "Python", "Lang::Python::Async": "pycon"})
+    mw.col.decks.rename(mw.col.decks.byName("Lang::Python"), "Code::Py")
+    assert mw.addonManager.getConfig(PACKAGE)["deckdefaultlang"] == {
+        "Code::Py": "Python", "Code::Py::Async": "pycon"}
+    assert dl.deck_language(async_) == "pycon"
+    assert dl.deck_language(mw.col.decks.id("Code::Py")) == "Python"
+
+
+def test_values_of_the_wrong_type_are_replaced_by_the_default(mw):
+    config = addon_module("config")
+    set_config(mw, **{"linenos": "yes", "snippet cache size in MB": True, "favorites": "Python",
+                      "deckdefaultlang": ["CS"], "style": 3, "font": "Consolas"})
+    conf = config.snapshot()
+    defaults = config.Config()
+    assert conf.linenos == defaults.linenos
+    assert conf.snippet_cache_size_in_mb == defaults.snippet_cache_size_in_mb
+    assert conf.favorites == defaults.favorites
+    assert conf.deckdefaultlang == defaults.deckdefaultlang
+    assert conf.style == defaults.style
+    assert conf.font == "Consolas"
@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from css_optimizer import optimize_css, parse  # noqa: E402
+
+
+def test_semicolon_in_data_url():
+    css = '.a { background: url(data:image/png;base64,iVBO=); color: red }'
+    (rule,) = parse(css)
+    assert rule.declarations == [("background", "url(data:image/png;base64,iVBO=)"),
+                                 ("color", "red")]
+
+
+def test_semicolon_in_quotes():
+    (rule,) = parse('.a::before { content: "a;b"; font-family: \'x;y\', serif }')
+    assert rule.declarations == [("content", '"a;b"'), ("font-family", "'x;y', serif")]
+
+
+def test_comma_in_selector_function():
+    (rule,) = parse(".x :is(.a, .b), .y { color: red }")
+    assert rule.selectors == [".x :is(.a,.b)", ".y"]
+
+
+def test_token_rules_keep_their_order():
+    # pygments gives a span of a non-standard subtype all parent classes, e.g. "k k-Foo",
+    # so ".hl .k" must not move behind ".hl .k-Foo"
+    css = (".hl .k { color: red }\n"
+           ".hl .k-Foo { color: blue }\n"
+           ".hl .kc { color: red }\n")
+    assert optimize_css(css) == ".hl .k{color:red}\n.hl .k-Foo{color:blue}\n.hl .kc{color:red}\n"
@@ -0,0 +1,81 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from fuzzy_search import (  # noqa: E402
+    PENALTY_TYPO,
+    SearchIndex,
+    fuzzy_score,
+    split_search_terms_withStart,
+    typo_variants,
+)
+
+
+WORDS = ["Anatomy", "Pharmacology", "JavaScript", "java", "Python3", "spanish", "Verbs",
+         "kanji", "N5", "lecture_12", "Cardio", "algorithms", "SQL", "jsx", "Misc"]
+
+
+def deck_names(count, seed=0):
+    rnd = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        names.add("::".join(" ".join(rnd.sample(WORDS, rnd.randint(1, 2)))
+                            for _ in range(rnd.randint(1, 4))))
+    return sorted(names)
+
+
+def brute_force(keys, search_string, typos=False):
+    """the score of every matching key, by checking each key with fuzzy_score"""
+    terms = split_search_terms_withStart(search_string)
+    exact = [t for t in terms if not t[0] or t[1]]
+    fuzzy = [t[2] for t in terms if t[0] and not t[1]]
+    index = SearchIndex(keys)
+    scores = {}
+    for idx, key in enumerate(keys):
+        if not index.matches(idx, exact):
+            continue
+        total = 0
+        for term in fuzzy:
+            variants = typo_variants(term) if typos and len(term) > 2 else [term]
+            found = [fuzzy_score(v, key) - (PENALTY_TYPO if i else 0)
+                     for i, v in enumerate(variants) if fuzzy_score(v, key) is not None]
+            if not found:
+                break
+            total += max(found)
+        else:
+            scores[idx] = total
+    return scores
+
+
+def check_rank(index, keys, search_string, limit):
+    top, rest = index.rank(search_string, limit)
+    rest = list(rest)
+    scores = brute_force(keys, search_string)
+    if not scores:
+        scores = brute_force(keys, search_string, typos=True)
+    assert sorted(top + rest) == sorted(scores), search_string
+    assert rest == sorted(rest), search_string
+    # keys with the same score can be in any order
+    best = sorted(scores.values(), reverse=True)[:limit]
+    assert [scores[idx] for idx in top] == best, search_string
+
+
+QUERIES = ["a", "js", "java", "pharm ana", "sp verbs", "N5 kanji", "_Ana", "algo !java",
+           "Ana", "crdio", "lectrue", "ptyhon", "::", "S", "misc sql jsx n5"]
+
+
+def test_rank_finds_the_same_keys_as_brute_force():
+    keys = deck_names(3000)
+    for limit in (1, 5, 50):
+        for query in QUERIES:
+            check_rank(SearchIndex(keys), keys, query, limit)
+
+
+def test_rank_while_typing_uses_the_previous_candidates():
+    keys = deck_names(3000, seed=1)
+    index = SearchIndex(keys)
+    for query in ["pharm ana", "algo !java", "sp verbs", "lectrue"]:
+        for end in range(1, len(query) + 1):
+            check_rank(index, keys, query[:end], 20)
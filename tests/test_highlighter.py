@@ -0,0 +1,26 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pygments.styles import get_all_styles  # noqa: E402
+from pygments.token import STANDARD_TYPES  # noqa: E402
+
+from highlighter import cache_info, clear_caches, get_formatter  # noqa: E402
+
+
+def test_formatter_cache_ignores_how_options_are_passed():
+    clear_caches()
+    first = get_formatter("default", False, "highlight", "", True, compact=True, font="Consolas")
+    options = dict(font="Consolas", compact=True, noclasses=True, cssstyles="", cssclass="highlight",
+                   linenos=False, style="default", centerfragments=False)
+    assert get_formatter(**options) is first
+    assert cache_info()["formatters"]["misses"] == 1
+
+
+def test_short_classes_arent_token_classes():
+    # the css in the media folder styles the token classes inside the same <div>
+    token_classes = set(STANDARD_TYPES.values())
+    for style in get_all_styles():
+        formatter = get_formatter(style, False, f"shf__{style}__highlight", "", True, style_block=True)
+        assert not token_classes & set(formatter.short_classes.values()), style
@@ -0,0 +1,39 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from language_detection import SAMPLE_CHARS, detect  # noqa: E402
+
+
+FAVORITES = ["python", "html", "css", "javascript"]
+# so that the results don't depend on how busy the machine is (e.g. with the background
+# threads of the add-on in test_addon.py)
+BUDGET = 10
+
+
+def test_html_page():
+    code = ("<!DOCTYPE html><html><head><title>Lists</title></head><body>"
+            "<p>for each item in the list, if it is not None, return it</p></body></html>")
+    assert detect(code, FAVORITES, BUDGET).alias == "html"
+
+
+def test_html_fragment():
+    assert detect('<div class="a"><p>hi</p></div>', FAVORITES, BUDGET).alias == "html"
+
+
+def test_python_is_not_taken_for_html():
+    code = "import os\nfor i in range(3):\n    print(i)\n"
+    assert detect(code, FAVORITES, BUDGET).alias == "python"
+
+
+def test_only_the_start_of_big_pastes_is_used():
+    code = "def f(x):\n    return x\n" * (SAMPLE_CHARS // 10)
+    assert detect(code, FAVORITES, BUDGET).alias == "python"
+
+
+def test_candidates_that_arent_regex_lexers():
+    # html+django and erb are DelegatingLexers, pycon isn't a RegexLexer either
+    code = "{% for item in items %}<li>{{ item.name }}</li>{% endfor %}"
+    detected = detect(code, ["python", "html+django", "pycon", "erb", "html+php"], BUDGET)
+    assert detected is not None
@@ -0,0 +1,53 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from highlighter import get_formatter, get_lexer, render_snippet  # noqa: E402
+from rehighlight_worker import block_spans, rehighlight_field  # noqa: E402
+
+
+OPTIONS = {
+    "style": "monokai",
+    "linenos": False,
+    "centerfragments": False,
+    "noclasses": True,
+    "css_class": "shf__monokai__highlight",
+    "cssstyles": "text-align: left;",
+    "font": "",
+    "compact": False,
+    "style_block": False,
+    "stripall": False,
+    "defaultlang": "python",
+    "candidates": ["python"],
+}
+
+
+def snippet(code, style="default", inline=False):
+    css_class = f"shf__{style}__highlight"
+    formatter = get_formatter(style, False, css_class, "text-align: left;", True, inline=inline)
+    html = render_snippet(code, get_lexer("python", False), formatter, inline=inline, linenos=False,
+                          centerfragments=False, noclasses=True, css_class=css_class)
+    return html[:-len("<br>")] if html.endswith("<br>") else html
+
+
+def test_only_the_snippets_change():
+    # markup that BeautifulSoup would write differently
+    before = "<p class=note>a &amp; b &#39;c&#39;<br/><img src='x.png'>\n"
+    between = "<li>open<div><b>text</b></div>"
+    after = "<hr/>&nbsp;end"
+    first, second = snippet("x = 1\nprint(x)\n"), snippet("y = [1, 2]", inline=True)
+    new, count = rehighlight_field(before + first + between + second + after, OPTIONS)
+    assert count == 2
+    rehighlighted = [snippet("x = 1\nprint(x)\n", "monokai"), snippet("y = [1, 2]", "monokai", True)]
+    assert new == before + rehighlighted[0] + between + rehighlighted[1] + after
+
+
+def test_nested_blocks_are_one_snippet():
+    html = "<b>x</b>" + snippet("def f():\n    return 1\n") + "<br>"
+    (start, end), = block_spans(html)
+    assert html[start:end] == html[len("<b>x</b>"):-len("<br>")]
+
+
+def test_field_without_snippets():
+    assert rehighlight_field("<div>no <b>code</b></div>", OPTIONS) == (None, 0)
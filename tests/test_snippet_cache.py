@@ -0,0 +1,59 @@
+import itertools
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import snippet_cache  # noqa: E402
+from snippet_cache import SnippetCache  # noqa: E402
+
+
+ENTRY = 1000  # bytes
+MB = 1024 * 1024
+
+
+def make_cache(tmp_path, monkeypatch, entries):
+    # a clock that never returns the same time twice so that the order is always clear
+    clock = itertools.count(1)
+    monkeypatch.setattr(snippet_cache, "time", types.SimpleNamespace(time=lambda: next(clock)))
+    return SnippetCache(str(tmp_path / "cache" / "snippets.db"), entries * ENTRY / MB)
+
+
+def cached(cache, keys):
+    return [k for k in keys if cache.get(k) is not None]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, monkeypatch, 3)
+    for key in "abc":
+        cache.put(key, key * ENTRY)
+    assert cache.get("a") == "a" * ENTRY   # now b is the least recently used
+    cache.put("d", "d" * ENTRY)
+    assert cached(cache, "abcd") == ["a", "c", "d"]
+    cache.put("e", "e" * ENTRY)
+    # cached() used a, c and d in this order
+    assert cached(cache, "abcde") == ["c", "d", "e"]
+    assert cache.total_size == 3 * ENTRY
+
+
+def test_a_large_entry_evicts_as_many_as_needed(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, monkeypatch, 3)
+    for key in "abc":
+        cache.put(key, key * ENTRY)
+    cache.put("d", "d" * 2 * ENTRY)
+    assert cached(cache, "abcd") == ["c", "d"]
+    # larger than the whole cache
+    cache.put("e", "e" * 4 * ENTRY)
+    assert cached(cache, "abcde") == ["c", "d"]
+
+
+def test_smaller_limit_and_reopened_cache(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, monkeypatch, 3)
+    for key in "abc":
+        cache.put(key, key * ENTRY)
+    cache.set_max_size(2 * ENTRY / MB)
+    assert cached(cache, "abc") == ["b", "c"]
+    reopened = SnippetCache(cache.path, 2 * ENTRY / MB)
+    assert cached(reopened, "abc") == ["b", "c"]
+    assert reopened.total_size == 2 * ENTRY
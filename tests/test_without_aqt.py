@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# these files are used outside of Anki too: by the worker processes for re-highlighting,
+# by the benchmarks and by these tests
+WITHOUT_AQT = ["css_optimizer", "fuzzy_search", "highlighter", "language_detection", "prewarm",
+               "rehighlight_worker", "snippet_cache", "timings"]
+
+SCRIPT = """
+import sys
+class NoAqt:
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in ("aqt", "anki"):
+            raise ImportError("imports " + name)
+sys.meta_path.insert(0, NoAqt())
+sys.path.insert(0, sys.argv[1])
+import importlib
+importlib.import_module(sys.argv[2])
+"""
+
+
+def test_modules_dont_import_aqt():
+    for module in WITHOUT_AQT:
+        proc = subprocess.run([sys.executable, "-c", SCRIPT, src, module],
+                              capture_output=True, encoding="utf-8")
+        assert proc.returncode == 0, proc.stderr